@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from nutriscore_engine import NutriScoreEngine
+
+DATASET = 'NutriScore_Dynamic_Dataset_Cleaned.csv'
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+
+# Étape mesurée : setup(df) prépare l'entrée (hors chrono), run(ctx) est chronométré.
+# max_rows borne les chemins ligne à ligne, trop lents sur les grandes tailles.
+Stage = namedtuple("Stage", ["name", "setup", "run", "max_rows"])
+
+
+def make_products(n_rows, seed=0, source=DATASET):
+    """
+    Table synthétique au format de NutriScore_Dynamic_Dataset_Cleaned.csv :
+    lignes tirées du vrai dataset, valeurs nutritionnelles bruitées, et
+    NutriScore recalculé pour rester cohérent avec les valeurs.
+    Les colonnes texte sont catégorielles pour tenir 10^7 lignes en mémoire.
+    """
+    base = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(len(base), size=n_rows)
+
+    df = {}
+    for col in base.columns:
+        values = base[col]
+        if pd.api.types.is_numeric_dtype(values):
+            df[col] = values.to_numpy()[idx]
+        else:
+            cat = pd.Categorical(values)
+            df[col] = pd.Categorical.from_codes(cat.codes[idx], categories=cat.categories)
+    df = pd.DataFrame(df, columns=base.columns)
+
+    for col in ["Energie_kJ", "Sucres_g", "Graisses_Sat_g", "Sel_g",
+                "Proteines_g", "Fibres_g", "Fruits_Legumes_Pct"]:
+        noisy = df[col].to_numpy() * rng.lognormal(0.0, 0.1, n_rows)
+        df[col] = np.clip(noisy, 0, 100 if col != "Energie_kJ" else None)
+    df["GreenScore_Score"] = np.clip(
+        df["GreenScore_Score"].to_numpy() + rng.integers(-5, 6, n_rows), 0, 100
+    )
+
+    ns = NutriScoreEngine.calculate_many(df, columns=NutriScoreEngine.DATASET_COLUMNS)
+    df["NutriScore_Score"] = ns["score"]
+    df["NutriScore_Lettre"] = pd.Categorical(ns["grade"], categories=list("ABCDE"))
+    df["Points_N"] = ns["n_total"]
+    df["Points_P"] = ns["p_total"]
+    return df
+
+
+def _electre_model(df=None):
+    from electre import ElectreTri, criteria, directions, weights, category_labels
+
+    model = ElectreTri(criteria=criteria, directions=directions, weights=weights,
+                       category_labels=category_labels, lambdas=(0.6, 0.7))
+    if df is not None:
+        model.build_limiting_profiles(df)
+    return model
+
+
+def _nutri_records(df):
+    cols = NutriScoreEngine.DATASET_COLUMNS
+    return pd.DataFrame({k: df[v] for k, v in cols.items()}).to_dict("records")
+
+
+def _wsm_model():
+    from electre import criteria, directions
+    from models import WeightedSumModel
+
+    return WeightedSumModel(criteria, directions, {c: 1 for c in criteria})
+
+
+def _rf_model():
+    from electre import criteria
+    from models import RandomForestNutri
+
+    return RandomForestNutri(criteria=criteria, target_col="NutriScore_Lettre")
+
+
+def _electre_rowwise(ctx):
+    model, df = ctx
+    for _, row in df.iterrows():
+        model._assign_pessimistic_row(row, 0.7)
+        model._assign_optimistic_row(row, 0.7)
+
+
+STAGES = [
+    Stage("nutriscore.calculate", _nutri_records,
+          lambda recs: [NutriScoreEngine.calculate(r) for r in recs], 100_000),
+    Stage("nutriscore.calculate_many", lambda df: df,
+          lambda df: NutriScoreEngine.calculate_many(df, columns=NutriScoreEngine.DATASET_COLUMNS), None),
+    Stage("electre.build_limiting_profiles", lambda df: (_electre_model(), df),
+          lambda ctx: ctx[0].build_limiting_profiles(ctx[1]), None),
+    Stage("electre.assign_pessimistic", lambda df: (_electre_model(df), df),
+          lambda ctx: ctx[0].assign_pessimistic(ctx[1], 0.7), None),
+    Stage("electre.assign_optimistic", lambda df: (_electre_model(df), df),
+          lambda ctx: ctx[0].assign_optimistic(ctx[1], 0.7), None),
+    Stage("electre.assign_rowwise", lambda df: (_electre_model(df), df),
+          _electre_rowwise, 10_000),
+    Stage("electre.apply_and_confusion", lambda df: (_electre_model(), df.copy(deep=False)),
+          lambda ctx: ctx[0].apply_and_confusion(ctx[1]), None),
+    Stage("wsm.score_dataset", lambda df: (_wsm_model(), df.copy(deep=False)),
+          lambda ctx: ctx[0].score_dataset(ctx[1]), None),
+    Stage("rf.add_predictions_and_confusion", lambda df: (_rf_model(), df.copy(deep=False)),
+          lambda ctx: ctx[0].add_predictions_and_confusion(ctx[1], n_train=50), 1_000_000),
+]
+
+
+def run_stage(stage, df, repeat=1, memory=True):
+    """Meilleur temps sur `repeat` exécutions, puis une exécution sous tracemalloc."""
+    best_wall, best_cpu = np.inf, np.inf
+    for _ in range(repeat):
+        ctx = stage.setup(df)
+        wall, cpu = time.perf_counter(), time.process_time()
+        stage.run(ctx)
+        best_wall = min(best_wall, time.perf_counter() - wall)
+        best_cpu = min(best_cpu, time.process_time() - cpu)
+
+    peak_mb = None
+    if memory:
+        ctx = stage.setup(df)
+        tracemalloc.start()
+        stage.run(ctx)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    return {
+        "stage": stage.name, "rows": len(df),
+        "wall_s": round(best_wall, 6), "cpu_s": round(best_cpu, 6),
+        "rows_per_sec": round(len(df) / best_wall, 1) if best_wall > 0 else None,
+        "peak_mb": round(peak_mb, 2) if peak_mb is not None else None,
+    }
+
+
+def run_benchmarks(sizes, stage_filter=None, repeat=1, memory=True, seed=0):
+    results = []
+    for n_rows in sizes:
+        df = make_products(n_rows, seed=seed)
+        for stage in STAGES:
+            if stage_filter and not any(stage.name.startswith(f) for f in stage_filter):
+                continue
+            if stage.max_rows is not None and n_rows > stage.max_rows:
+                continue
+            res = run_stage(stage, df, repeat, memory)
+            print(f"{res['stage']:<36} {n_rows:>10} rows  {res['wall_s']:>10.4f} s  "
+                  f"{res['rows_per_sec'] or 0:>14.0f} rows/s  peak {res['peak_mb']} MB")
+            results.append(res)
+    return results
+
+
+def measure_cold_start(source=DATASET, repeat=3):
+    """
+    Démarrage à froid, dans un nouvel interpréteur : import d'electre seul,
+    puis `cli.py score` sur un fichier (import + lecture + scoring + écriture).
+    """
+    n_rows = sum(1 for _ in open(source, encoding="utf-8")) - 1
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        commands = [
+            ("cold_start.import_electre", 0, [sys.executable, "-c", "import electre"]),
+            ("cold_start.cli_score", n_rows,
+             [sys.executable, CLI, "score", source, os.path.join(tmp, "scored.csv")]),
+        ]
+        for name, rows, cmd in commands:
+            best = np.inf
+            for _ in range(repeat):
+                start = time.perf_counter()
+                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+                best = min(best, time.perf_counter() - start)
+            print(f"{name:<36} {rows:>10} rows  {best:>10.4f} s")
+            results.append({
+                "stage": name, "rows": rows, "wall_s": round(best, 6), "cpu_s": None,
+                "rows_per_sec": round(rows / best, 1) if rows else None, "peak_mb": None,
+            })
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """
+    Étapes dont le débit (rows/s) a baissé de plus de `tolerance` par rapport
+    à la référence (temps total pour les mesures sans nombre de lignes).
+    """
+    reference = {(r["stage"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for res in results:
+        ref = reference.get((res["stage"], res["rows"]))
+        if not ref:
+            continue
+        if ref.get("rows_per_sec") and res.get("rows_per_sec"):
+            ratio = res["rows_per_sec"] / ref["rows_per_sec"]
+        elif ref.get("wall_s") and res.get("wall_s"):
+            ratio = ref["wall_s"] / res["wall_s"]
+        else:
+            continue
+        if ratio < 1 - tolerance:
+            regressions.append({**res, "baseline_rows_per_sec": ref.get("rows_per_sec"),
+                                "baseline_wall_s": ref.get("wall_s"), "ratio": round(ratio, 3)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark des étapes de scoring")
+    parser.add_argument("--sizes", default="1e3,1e4,1e5",
+                        help="tailles de table, ex : 1e3,1e4,1e5,1e6,1e7")
+    parser.add_argument("--stages", help="préfixes d'étapes, ex : electre,nutriscore")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="ne pas mesurer le pic mémoire")
+    parser.add_argument("--output", help="fichier json des résultats")
+    parser.add_argument("--baseline", help="résultats de référence (json) à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--cold-start", action="store_true",
+                        help="mesure aussi le démarrage à froid (import, cli.py score)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(float(s)) for s in args.sizes.split(",")]
+    stage_filter = args.stages.split(",") if args.stages else None
+    results = run_benchmarks(sizes, stage_filter, args.repeat, not args.no_memory)
+    if args.cold_start:
+        results += measure_cold_start(repeat=max(args.repeat, 3))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"⚠️ Régression {r['stage']} ({r['rows']} lignes) : "
+                  f"{r['rows_per_sec']} rows/s vs {r['baseline_rows_per_sec']}, "
+                  f"{r['wall_s']} s vs {r['baseline_wall_s']} s (x{r['ratio']})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
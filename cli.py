@@ -0,0 +1,145 @@
+import argparse
+import time
+
+# electre (et donc pandas) n'est importé que dans les commandes :
+# `python cli.py --help` reste instantané.
+
+
+def _lambdas(text):
+    return tuple(float(x) for x in text.split(","))
+
+
+def _model(lambdas=(0.6, 0.7), profiles=None, group_col=None):
+    from electre import ElectreTri, criteria, directions, weights, category_labels
+
+    model = ElectreTri(criteria=criteria, directions=directions, weights=weights,
+                       category_labels=category_labels, lambdas=lambdas, group_col=group_col)
+    if profiles:
+        model.load_profiles(profiles)
+    return model
+
+
+def cmd_score(args):
+    """Nutri-Score + affectations ELECTRE d'un fichier, par blocs."""
+    from electre import score_dataset_streaming
+
+    model = _model(_lambdas(args.lambdas), args.profiles, args.group_col)
+    n_rows = score_dataset_streaming(args.input, args.output, model, chunksize=args.chunksize,
+                                     sheet_name=args.sheet)
+    if args.save_profiles:
+        model.save_profiles(args.save_profiles)
+    return f"{n_rows} lignes -> {args.output}"
+
+
+def cmd_sweep(args):
+    """Matrices de confusion pour une grille de lambda, résumé par colonne."""
+    from dataset_io import read_dataset
+    from electre import ElectreTri
+
+    lambdas = ElectreTri.lambda_grid(args.start, args.stop, args.step)
+    model = _model(lambdas, args.profiles, args.group_col)
+    columns = model.criteria + [args.target] + ([model.group_col] if model.group_col else [])
+    df = read_dataset(args.input, args.sheet, usecols=columns)
+    acc = model.sweep_confusions(df, lambdas, target_col=args.target, chunksize=args.chunksize)
+    summary = acc.summary().sort_values("accuracy", ascending=False)
+    if args.output:
+        summary.to_csv(args.output, index_label="colonne")
+    return summary.head(args.top).round(4).to_string()
+
+
+def cmd_report(args):
+    """Rapport html/png d'un balayage de lambda : histogramme, superpositions, matrices."""
+    from dataset_io import read_dataset
+    from electre import ElectreTri
+    from report import RunReport
+
+    lambdas = ElectreTri.lambda_grid(args.start, args.stop, args.step)
+    model = _model(lambdas, args.profiles, args.group_col)
+    columns = model.criteria + [args.target] + ([model.group_col] if model.group_col else [])
+    df = read_dataset(args.input, args.sheet, usecols=columns)
+    acc = model.sweep_confusions(df, lambdas, target_col=args.target, chunksize=args.chunksize)
+    report = RunReport(args.output, title=f"ELECTRE TRI : {args.input}")
+    report.add_sweep(acc)
+    res = report.render(n_jobs=args.jobs, force=args.force)
+    return (f"{res['figures']} figures ({res['rendered']} dessinées, {res['skipped']} inchangées) "
+            f"-> {res['index']}")
+
+
+def cmd_profiles(args):
+    """Profils pi1..pi6 (exacts, ou par sketches de quantiles avec --rank-error), par groupe avec --group-col."""
+    from dataset_io import iter_dataset_chunks, read_dataset
+
+    model = _model(group_col=args.group_col)
+    columns = model.criteria + ([args.group_col] if args.group_col else [])
+    if args.rank_error:
+        sketches = model.new_profile_sketches(rank_error=args.rank_error)
+        group_sketches = {}
+        for chunk in iter_dataset_chunks(args.input, args.chunksize, args.sheet, usecols=columns):
+            model.update_profile_sketches(sketches, chunk)
+            if args.group_col:
+                model.update_group_profile_sketches(group_sketches, chunk, rank_error=args.rank_error)
+        model.build_limiting_profiles_from_sketches(sketches)
+        if args.group_col:
+            model.build_group_profiles_from_sketches(group_sketches)
+    else:
+        model.build_limiting_profiles(read_dataset(args.input, args.sheet, usecols=columns))
+    model.save_profiles(args.output)
+    if model.group_profiles is not None:
+        return f"{len(model.group_profiles) // 6} groupes ({args.group_col}) + profils globaux -> {args.output}"
+    return model.profiles.to_string()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scoring Nutri-Score / ELECTRE TRI sans interface graphique")
+    parser.add_argument("--timings", action="store_true", help="affiche le temps total de la commande")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def command(name, func, help):
+        p = sub.add_parser(name, help=help)
+        p.set_defaults(func=func)
+        p.add_argument("input", help="dataset csv ou xlsx")
+        p.add_argument("--sheet", default="Sheet1", help="feuille du xlsx")
+        p.add_argument("--chunksize", type=int, default=100_000)
+        p.add_argument("--group-col", help="profils par groupe, ex : Categorie")
+        return p
+
+    score = command("score", cmd_score, "scorer un fichier (NutriScore_Calc_*, ELECTRE_*)")
+    score.add_argument("output", help="csv de sortie")
+    score.add_argument("--profiles", help="profils (csv de save_profiles) ; sinon construits sur le fichier")
+    score.add_argument("--lambdas", default="0.6,0.7", help="ex : 0.6,0.7")
+    score.add_argument("--save-profiles", help="sauvegarde les profils utilisés")
+
+    sweep = command("sweep", cmd_sweep, "balayage de lambda : accuracy, rappel par classe, erreurs d'une classe")
+    sweep.add_argument("--profiles")
+    sweep.add_argument("--start", type=float, default=0.5)
+    sweep.add_argument("--stop", type=float, default=0.95)
+    sweep.add_argument("--step", type=float, default=0.01)
+    sweep.add_argument("--target", default="NutriScore_Lettre")
+    sweep.add_argument("--top", type=int, default=10, help="lignes affichées")
+    sweep.add_argument("--output", help="csv du résumé complet")
+
+    report = command("report", cmd_report, "rapport html/png d'un balayage de lambda, sans affichage")
+    report.add_argument("output", help="dossier du rapport (index.html, png, report.json)")
+    report.add_argument("--profiles")
+    report.add_argument("--start", type=float, default=0.5)
+    report.add_argument("--stop", type=float, default=0.95)
+    report.add_argument("--step", type=float, default=0.01)
+    report.add_argument("--target", default="NutriScore_Lettre")
+    report.add_argument("--jobs", type=int, default=-1, help="processus de rendu (-1 = tous les cœurs)")
+    report.add_argument("--force", action="store_true", help="redessine aussi les figures inchangées")
+
+    profiles = command("profiles", cmd_profiles, "construire et sauvegarder les profils pi1..pi6")
+    profiles.add_argument("output", help="csv des profils")
+    profiles.add_argument("--rank-error", type=float,
+                          help="profils par sketches de quantiles (mémoire bornée), ex : 0.005")
+
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    print(args.func(args))
+    if args.timings:
+        print(f"{args.command} : {time.perf_counter() - start:.3f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
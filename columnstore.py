@@ -0,0 +1,224 @@
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnStore:
+    """
+    Stockage colonne par colonne du dataset dans un dossier :
+    - une colonne numérique = un fichier .npy typé, relu en memory-map (zéro copie)
+    - une colonne texte (lettres, catégories, noms) = codes entiers .npy
+      + modalités dans meta.json, relue en pd.Categorical (code -1 = valeur manquante)
+    Chaque étape (ELECTRE, RF, WSM) n'ajoute que ses propres colonnes, rattachées
+    à son nom d'étape ("source" pour les colonnes d'origine).
+    """
+    META_FILE = "meta.json"
+
+    def __init__(self, path):
+        self.path = path
+        self.meta = {"n_rows": None, "columns": {}}
+        meta_path = os.path.join(path, self.META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                self.meta = json.load(f)
+
+    @classmethod
+    def from_dataframe(cls, path, df):
+        """Crée (ou remplace) un store à partir d'un DataFrame complet."""
+        store = cls(path)
+        store.meta = {"n_rows": None, "columns": {}}
+        store.append_columns(df, overwrite=True)
+        return store
+
+    @property
+    def n_rows(self):
+        return self.meta["n_rows"]
+
+    @property
+    def columns(self):
+        return list(self.meta["columns"])
+
+    def exists(self):
+        return self.n_rows is not None
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{self.meta['columns'][name]['file']}.npy")
+
+    def _save_meta(self):
+        tmp = os.path.join(self.path, self.META_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, os.path.join(self.path, self.META_FILE))
+
+    def _save_array(self, file, values):
+        # écriture atomique : un lecteur ne voit jamais un fichier à moitié écrit
+        tmp = os.path.join(self.path, f"{file}.tmp.npy")
+        np.save(tmp, values)
+        os.replace(tmp, os.path.join(self.path, f"{file}.npy"))
+
+    def stage_columns(self, *stages):
+        """Colonnes produites par les étapes données."""
+        return [c for c, entry in self.meta["columns"].items() if entry["stage"] in stages]
+
+    def append_columns(self, df, columns=None, stage="source", overwrite=False):
+        """
+        Ajoute les colonnes `columns` de df (toutes par défaut) pour l'étape `stage`.
+        Une colonne déjà présente n'est réécrite que si overwrite=True.
+        """
+        columns = list(df.columns) if columns is None else list(columns)
+        if self.n_rows is not None and len(df) != self.n_rows:
+            raise ValueError(f"{len(df)} lignes, le store en contient {self.n_rows}.")
+        os.makedirs(self.path, exist_ok=True)
+
+        for name in columns:
+            if name in self.meta["columns"] and not overwrite:
+                print(f"⚠️ Colonne '{name}' déjà existante → non modifiée.")
+                continue
+
+            col = df[name]
+            entry = self.meta["columns"].get(name, {"file": f"col{len(self.meta['columns']):03d}"})
+            entry["stage"] = stage
+            if pd.api.types.is_numeric_dtype(col.dtype):
+                self._save_array(entry["file"], col.to_numpy())
+                entry.pop("categories", None)
+            else:
+                cat = pd.Categorical(col)
+                codes = cat.codes.astype(np.int16 if len(cat.categories) < 2 ** 15 else np.int32)
+                self._save_array(entry["file"], codes)
+                entry["categories"] = [str(c) for c in cat.categories]
+            self.meta["columns"][name] = entry
+
+        self.meta["n_rows"] = len(df)
+        self._save_meta()
+        return self
+
+    def _encode(self, name, col):
+        """
+        Valeurs de col au format du fichier de la colonne name : tableau
+        numérique, ou codes dans les modalités de meta.json (complétées au besoin).
+        """
+        categories = self.meta["columns"][name].get("categories")
+        if categories is None:
+            values = np.asarray(col)
+            if not (np.issubdtype(values.dtype, np.number) or values.dtype == bool):
+                raise ValueError(f"Colonne '{name}' : valeurs non numériques.")
+            return values
+        values = pd.Series(np.asarray(col, dtype=object))
+        known = values.notna().to_numpy()
+        labels = values[known].astype(str)
+        new = labels[~labels.isin(categories)].unique()
+        categories.extend(str(c) for c in new)
+        codes = np.full(len(values), -1, dtype=np.int32)
+        codes[known] = pd.Index(categories).get_indexer(labels)
+        return codes
+
+    def _fit_dtype(self, name, values):
+        """
+        Type du fichier de la colonne name, élargi si values n'y tient pas
+        (entiers -> float, codes int16 -> int32) : la colonne est alors réécrite.
+        """
+        entry = self.meta["columns"][name]
+        stored = np.load(self._file(name), mmap_mode="r")
+        if "categories" in entry:
+            dtype = np.dtype(np.int16 if len(entry["categories"]) < 2 ** 15 else np.int32)
+            dtype = np.promote_types(stored.dtype, dtype)
+        else:
+            dtype = np.result_type(stored.dtype, values.dtype)
+        if dtype != stored.dtype:
+            widened = stored.astype(dtype)
+            del stored
+            self._save_array(entry["file"], widened)
+        return dtype
+
+    def write_rows(self, df, positions, columns=None):
+        """
+        Réécrit sur place les lignes `positions` des colonnes `columns` (toutes
+        celles de df par défaut), via un memory-map en écriture : seules les
+        pages touchées sont écrites, le reste du fichier n'est pas relu.
+        Contrairement à append_columns, l'écriture n'est pas atomique.
+        """
+        columns = list(df.columns) if columns is None else list(columns)
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(positions) != len(df):
+            raise ValueError(f"{len(df)} lignes pour {len(positions)} positions.")
+        if df[columns].columns.duplicated().any():
+            raise ValueError("Colonnes en double dans df.")
+        if len(positions) and (positions.min() < 0 or positions.max() >= self.n_rows):
+            raise ValueError(f"Positions hors du store ({self.n_rows} lignes).")
+
+        for name in columns:
+            values = self._encode(name, df[name])
+            dtype = self._fit_dtype(name, values)
+            stored = np.load(self._file(name), mmap_mode="r+")
+            stored[positions] = values.astype(dtype)
+            stored.flush()
+            del stored
+        self._save_meta()
+        return self
+
+    def append_rows(self, df):
+        """
+        Ajoute les lignes de df à la fin de toutes les colonnes du store (valeur
+        manquante pour les colonnes absentes de df). Les fichiers .npy sont
+        prolongés sur place : numpy réserve dans l'en-tête la place d'une forme
+        plus grande, seuls l'en-tête et les nouvelles valeurs sont écrits.
+        """
+        if self.n_rows is None:
+            raise ValueError("Store vide : créer les colonnes avec append_columns.")
+        if df.columns.duplicated().any():
+            raise ValueError("Colonnes en double dans df.")
+        n_rows = self.n_rows + len(df)
+        for name in self.columns:
+            col = df[name] if name in df.columns else pd.Series(np.nan, index=df.index)
+            values = self._encode(name, col)
+            dtype = self._fit_dtype(name, values)
+            self._extend_array(name, values.astype(dtype), n_rows)
+        self.meta["n_rows"] = n_rows
+        self._save_meta()
+        return self
+
+    def _extend_array(self, name, values, n_rows):
+        """Prolonge le fichier de name par values (n_rows lignes au total)."""
+        fmt = np.lib.format
+        path = self._file(name)
+        with open(path, "r+b") as f:
+            version = fmt.read_magic(f)
+            if version in ((1, 0), (2, 0)):
+                read_header = fmt.read_array_header_1_0 if version == (1, 0) else fmt.read_array_header_2_0
+                write_header = fmt.write_array_header_1_0 if version == (1, 0) else fmt.write_array_header_2_0
+                shape, fortran_order, dtype = read_header(f)
+                data_start = f.tell()
+                header = io.BytesIO()
+                write_header(header, {"shape": (n_rows,), "fortran_order": fortran_order,
+                                      "descr": fmt.dtype_to_descr(dtype)})
+                if header.tell() == data_start:
+                    # données d'abord, en-tête ensuite : un arrêt entre les deux
+                    # laisse un fichier lisible, à l'ancienne taille
+                    f.seek(data_start + shape[0] * dtype.itemsize)
+                    f.write(np.ascontiguousarray(values).tobytes())
+                    f.truncate()
+                    f.seek(0)
+                    f.write(header.getvalue())
+                    return
+        # en-tête trop court pour la nouvelle forme : réécriture complète
+        self._save_array(self.meta["columns"][name]["file"], np.concatenate([np.load(path), values]))
+
+    def column(self, name, mmap=True):
+        """Tableau numpy d'une colonne (memory-map en lecture seule si mmap)."""
+        values = np.load(self._file(name), mmap_mode="r" if mmap else None)
+        categories = self.meta["columns"][name].get("categories")
+        if categories is None:
+            return values
+        return pd.Categorical.from_codes(np.asarray(values), categories=categories)
+
+    def read(self, columns=None, mmap=True):
+        """DataFrame des colonnes demandées, sans copie pour les colonnes numériques."""
+        columns = self.columns if columns is None else list(columns)
+        return pd.DataFrame({c: self.column(c, mmap) for c in columns}, copy=False)
+
+    def criteria_array(self, criteria):
+        """Matrice (n_produits x n_critères) en float, sans passer par un DataFrame."""
+        return np.column_stack([np.asarray(self.column(c), dtype=float) for c in criteria])
@@ -0,0 +1,38 @@
+import pandas as pd
+
+
+def _iter_excel_chunks(path, chunksize, sheet_name='Sheet1', usecols=None):
+    """Lecture d'un xlsx ligne à ligne (openpyxl read-only), par blocs."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header = list(next(rows))
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) == chunksize:
+                chunk = pd.DataFrame(buffer, columns=header)
+                yield chunk[usecols] if usecols is not None else chunk
+                buffer = []
+        if buffer:
+            chunk = pd.DataFrame(buffer, columns=header)
+            yield chunk[usecols] if usecols is not None else chunk
+    finally:
+        wb.close()
+
+
+def iter_dataset_chunks(path, chunksize=100_000, sheet_name='Sheet1', usecols=None):
+    """Itère sur le dataset (csv ou xlsx) par blocs de chunksize lignes."""
+    if str(path).lower().endswith(('.xlsx', '.xlsm')):
+        yield from _iter_excel_chunks(path, chunksize, sheet_name, usecols)
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=usecols)
+
+
+def read_dataset(path, sheet_name='Sheet1', usecols=None):
+    """Lit le dataset entier (csv ou xlsx)."""
+    if str(path).lower().endswith(('.xlsx', '.xlsm')):
+        return pd.read_excel(path, sheet_name=sheet_name, usecols=usecols)
+    return pd.read_csv(path, usecols=usecols)
@@ -1,19 +1,14 @@
 # %%
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix
-
-# %%
-df = pd.read_excel('NutriScore_Dynamic_Dataset.xlsx', sheet_name='Sheet1')
-df.head()
-
-# %%
-df['Nom_Produit'] = df['Nom_Produit'].str.replace(r'[^\w\s]', '', regex=True)
-df.head()
 
-# %%
-df.to_csv('NutriScore_Dynamic_Dataset_Cleaned.csv', index=False)
+from columnstore import ColumnStore
+from dataset_io import iter_dataset_chunks, read_dataset
+from instrumentation import instrumented, stage
+from nutriscore_engine import NutriScoreEngine
 
 # %%
 def add_column_if_missing(df, colname, values):
@@ -25,10 +20,474 @@ def add_column_if_missing(df, colname, values):
     return df
 
 
+class QuantileSketch:
+    """
+    Sketch de quantiles de type KLL : alimenté par blocs, fusionnable entre
+    workers, taille O(k) quelle que soit la quantité de données vue.
+    Le niveau h contient des valeurs de poids 2**h ; un niveau trop plein est
+    trié puis une valeur sur deux (décalage aléatoire) monte au niveau suivant.
+    L'erreur de rang normalisée est de l'ordre de rank_error.
+    """
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.n = 0
+        self.min = np.nan
+        self.max = np.nan
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    # Erreur de rang normalisée ~ ERROR_SCALE / k ** ERROR_EXPONENT : ajustement
+    # empirique de l'implémentation KLL d'Apache DataSketches
+    # (KllSketch.getNormalizedRankError, erreur d'un quantile, confiance 99 %),
+    # pour le même schéma de compaction (capacités en (2/3)**profondeur,
+    # décalage aléatoire). Ce n'est pas une borne démontrée. Vérifié ici sur
+    # 20 x 200 000 valeurs normales en 20 blocs : pire erreur sur 99 quantiles
+    # 0.021 / 0.0085 / 0.0050 pour une cible 0.02 / 0.01 / 0.005.
+    ERROR_SCALE = 2.296
+    ERROR_EXPONENT = 0.9723
+
+    @classmethod
+    def for_error(cls, rank_error, seed=0):
+        """Choisit k pour une erreur de rang normalisée visée (ex : 0.01) : inverse de rank_error."""
+        k = int(np.ceil((cls.ERROR_SCALE / rank_error) ** (1 / cls.ERROR_EXPONENT)))
+        return cls(k=max(k, 8), seed=seed)
+
+    @property
+    def rank_error(self):
+        """Erreur de rang normalisée approximative pour ce k."""
+        return self.ERROR_SCALE / self.k ** self.ERROR_EXPONENT
+
+    @property
+    def is_exact(self):
+        """Vrai tant qu'aucune compaction n'a eu lieu."""
+        return len(self._levels) == 1
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            buf = self._levels[level]
+            if len(buf) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self._levels):
+                self._levels.append(np.empty(0))
+            buf = np.sort(buf)
+            # nombre pair d'éléments compactés, l'éventuel reste reste au niveau
+            keep, buf = buf[len(buf) - len(buf) % 2:], buf[:len(buf) - len(buf) % 2]
+            promoted = buf[self._rng.integers(2)::2]
+            self._levels[level] = keep
+            self._levels[level + 1] = np.concatenate([self._levels[level + 1], promoted])
+            # l'ajout d'un niveau réduit la capacité des niveaux inférieurs
+            level = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = np.nanmin([self.min, values.min()])
+        self.max = np.nanmax([self.max, values.max()])
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fusionne other dans ce sketch (résultats de blocs ou de workers)."""
+        if other.n == 0:
+            return self
+        self.n += other.n
+        self.min = np.nanmin([self.min, other.min])
+        self.max = np.nanmax([self.max, other.max])
+        for level, buf in enumerate(other._levels):
+            if level == len(self._levels):
+                self._levels.append(np.empty(0))
+            self._levels[level] = np.concatenate([self._levels[level], buf])
+        self._compress()
+        return self
+
+    def quantile(self, qs):
+        qs = np.asarray(qs, dtype=float)
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        if self.is_exact:
+            # même interpolation linéaire que pandas.Series.quantile
+            return np.quantile(self._levels[0], qs)
+
+        values = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(buf), 2.0 ** h) for h, buf in enumerate(self._levels)])
+        order = np.argsort(values)
+        values, cum_weights = values[order], np.cumsum(weights[order])
+        idx = np.searchsorted(cum_weights, qs * cum_weights[-1], side='left')
+        result = values[np.minimum(idx, len(values) - 1)]
+        result = np.where(qs <= 0, self.min, np.where(qs >= 1, self.max, result))
+        return np.clip(result, self.min, self.max)
+
+
+class ConfusionAccumulator:
+    """
+    Matrices de confusion 5x5 (note réelle A..E x note prédite A..E) pour
+    plusieurs colonnes de prédiction à la fois, sur des notes encodées en
+    entiers (A..E -> 0..4, -1 = hors classes, ignoré comme dans sklearn).
+    Alimenté bloc par bloc (update), fusionnable entre blocs ou workers (merge) ;
+    accuracy, rappel par classe et taux d'erreur d'une classe se déduisent
+    des comptes, sans relire les colonnes.
+    """
+    GRADES = ("A", "B", "C", "D", "E")
+    BLOCK_ROWS = 1 << 14
+
+    def __init__(self, names=()):
+        self.names = []
+        self.counts = np.zeros((0, 5, 5), dtype=np.int64)
+        self._add_names(names)
+
+    @classmethod
+    def encode(cls, values):
+        """Lettres -> codes int8 0..4 (A..E), -1 pour toute autre valeur."""
+        return pd.Categorical(np.asarray(values, dtype=object), categories=cls.GRADES).codes.astype(np.int8)
+
+    def _add_names(self, names):
+        new = [n for n in dict.fromkeys(names) if n not in self.names]
+        if new:
+            self.names += new
+            self.counts = np.concatenate([self.counts, np.zeros((len(new), 5, 5), dtype=np.int64)])
+        return [self.names.index(n) for n in names]
+
+    def update(self, y_true, predictions):
+        """
+        y_true : codes réels (encode) ; predictions : dict nom -> codes prédits.
+        Toutes les matrices sont comptées dans un même bincount
+        (par blocs de BLOCK_ROWS lignes pour borner la mémoire).
+        """
+        names = list(predictions)
+        slots = np.asarray(self._add_names(names), dtype=np.int64)[:, None] * 25
+        y_true = np.asarray(y_true, dtype=np.int64)
+        preds = [np.asarray(predictions[n]) for n in names]
+        counts = np.zeros(len(self.names) * 25, dtype=np.int64)
+        for start in range(0, len(y_true), self.BLOCK_ROWS):
+            stop = start + self.BLOCK_ROWS
+            t = y_true[start:stop]
+            P = np.stack([p[start:stop] for p in preds]).astype(np.int64)   # (k, bloc)
+            valid = (t >= 0) & (P >= 0)
+            counts += np.bincount((slots + t * 5 + P)[valid], minlength=len(counts))
+        self.counts += counts.reshape(-1, 5, 5)
+        return self
+
+    def merge(self, other):
+        """Ajoute les comptes d'un autre accumulateur (bloc ou worker)."""
+        slots = self._add_names(other.names)
+        self.counts[slots] += other.counts
+        return self
+
+    def matrix(self, name):
+        return self.counts[self.names.index(name)]
+
+    def frame(self, name, pred_columns=("A'", "B'", "C'", "D'", "E'")):
+        """Matrice de confusion de `name` en DataFrame (lignes NS_A..NS_E)."""
+        return pd.DataFrame(self.matrix(name).copy(), index=[f"NS_{g}" for g in self.GRADES],
+                            columns=list(pred_columns))
+
+    def frames(self, pred_columns=("A'", "B'", "C'", "D'", "E'")):
+        return {name: self.frame(name, pred_columns) for name in self.names}
+
+    def totals(self):
+        return self.counts.sum(axis=(1, 2))
+
+    def accuracy(self):
+        """Part de notes exactes, par colonne (tableau aligné sur names)."""
+        return np.trace(self.counts, axis1=1, axis2=2) / np.maximum(self.totals(), 1)
+
+    def recall(self):
+        """Rappel par classe réelle (n_colonnes x 5), NaN si la classe est absente."""
+        support = self.counts.sum(axis=2)
+        diag = np.diagonal(self.counts, axis1=1, axis2=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(support > 0, diag / support, np.nan)
+
+    def off_by_one(self):
+        """Part des prédictions à exactement une classe de la note réelle."""
+        near = np.abs(np.subtract.outer(np.arange(5), np.arange(5))) == 1
+        return self.counts[:, near].sum(axis=1) / np.maximum(self.totals(), 1)
+
+    def summary(self):
+        """DataFrame par colonne : n, accuracy, off_by_one, recall_A..recall_E."""
+        out = pd.DataFrame({"n": self.totals(), "accuracy": self.accuracy(),
+                            "off_by_one": self.off_by_one()}, index=self.names)
+        for g, rec in zip(self.GRADES, self.recall().T):
+            out[f"recall_{g}"] = rec
+        return out
+
+
+_WORKER_MODEL = None
+_WORKER_LAMBDAS = ()
+
+
+def _init_electre_worker(model, lambdas):
+    """Initialisation d'un worker : profils et poids reçus une seule fois."""
+    global _WORKER_MODEL, _WORKER_LAMBDAS
+    _WORKER_MODEL = model
+    _WORKER_LAMBDAS = lambdas
+
+
+def _score_electre_partition(task):
+    """Indices de catégorie et matrices de confusion partielles d'une partition."""
+    X, true_codes, groups = task
+    indices = _WORKER_MODEL._sweep_indices(X, _WORKER_LAMBDAS, groups)
+    confusions = _WORKER_MODEL._confusion_accumulator(indices, true_codes)
+    return {c: idx.astype(np.int8) for c, idx in indices.items()}, confusions
+
+
+_SENSITIVITY_STATE = {}
+
+
+def _init_sensitivity_worker(model, partial_ap, partial_pa, true_rows, lambdas):
+    """Concordances partielles envoyées une seule fois par worker."""
+    _SENSITIVITY_STATE.update(model=model, partial_ap=partial_ap, partial_pa=partial_pa,
+                              true_rows=true_rows, lambdas=lambdas)
+
+
+def _evaluate_weight_block(W):
+    st = _SENSITIVITY_STATE
+    return st["model"]._evaluate_weights(st["partial_ap"], st["partial_pa"],
+                                         st["true_rows"], W, st["lambdas"])
+
+
+def _partial_concordance_linear(sa, sb, q, p):
+    """
+    c_j(a, b) sur valeurs signées : 1 si l'avance sb - sa <= q, 0 si elle est >= p,
+    linéaire entre les deux. Avec q = p, c'est le test sa + p >= sb de
+    _partial_concordance (et non sb - sa <= p, qui peut arrondir différemment).
+    """
+    if p > q:
+        out = (p - (sb - sa)) / (p - q)
+        return np.clip(out, 0.0, 1.0, out=out)
+    return sa + p >= sb
+
+
+def _discordance_factor(adv, p, v, C):
+    """(1 - d_j) / (1 - C) là où d_j > C, 1 ailleurs ; d_j : 0 si adv <= p, 1 si adv >= v."""
+    if v > p:
+        d = (adv - p) / (v - p)
+        np.clip(d, 0.0, 1.0, out=d)
+    else:
+        d = (adv >= v).astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(d > C, (1.0 - d) / (1.0 - C), 1.0)
+
+
+def _credibility(sX, sP, weights, q, p, v, groups=None):
+    """
+    Indices de crédibilité ELECTRE TRI-B sigma(a, pi_k) et sigma(pi_k, a),
+    matrices (n_produits x n_profils), à partir des valeurs signées
+    (s*x, s = +1/-1 selon la direction) des produits sX (n x m) et des
+    profils sP (n_profils x m) :
+    sigma = C * prod_{j : d_j > C} (1 - d_j) / (1 - C).
+    Avec groups (jeu de profils de chaque produit), sP est (n_jeux x n_profils x m).
+    Avec q = p et sans veto, sigma est la concordance simple (mêmes comparaisons
+    que _partial_concordance, cf. _partial_concordance_linear).
+    Les critères sont parcourus un à un : seules des matrices n x n_profils sont allouées.
+    """
+    def profile_values(j):
+        return sP[:, j] if groups is None else sP[groups, :, j]
+
+    n_profiles = sP.shape[-2]
+    c_ap = np.zeros((len(sX), n_profiles))
+    c_pa = np.zeros((len(sX), n_profiles))
+    for j in range(len(weights)):
+        sa, sb = sX[:, j, None], profile_values(j)
+        c_ap += weights[j] * _partial_concordance_linear(sa, sb, q[j], p[j])
+        c_pa += weights[j] * _partial_concordance_linear(sb, sa, q[j], p[j])
+
+    vetoes = np.flatnonzero(np.isfinite(v))
+    if len(vetoes) == 0:
+        return c_ap, c_pa
+    f_ap = np.ones_like(c_ap)
+    f_pa = np.ones_like(c_pa)
+    for j in vetoes:
+        adv = profile_values(j) - sX[:, j, None]
+        f_ap *= _discordance_factor(adv, p[j], v[j], c_ap)
+        f_pa *= _discordance_factor(-adv, p[j], v[j], c_pa)
+    return c_ap * f_ap, c_pa * f_pa
+
+
+def _grouped_quantiles(codes, n_groups, values, qs):
+    """
+    Quantiles qs (interpolation linéaire de np.quantile, comme Series.quantile),
+    min et max de values pour chaque groupe (codes 0..n_groups-1), NaN ignorés.
+    Un seul tri (groupe, valeur) pour tous les groupes.
+    Retourne (n_groups x len(qs), n_groups, n_groups).
+    """
+    order = np.lexsort((values, codes))      # NaN en fin de groupe
+    sorted_values = values[order]
+    sizes = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(sizes) - sizes
+    n = np.bincount(codes, weights=~np.isnan(values), minlength=n_groups).astype(np.intp)
+    last = np.maximum(n - 1, 0)
+
+    # indice virtuel (n - 1) * q, puis la même interpolation que np.quantile
+    virtual = (n - 1)[:, None] * np.asarray(qs, dtype=float)[None, :]
+    below = np.floor(virtual)
+    gamma = virtual - below
+    below = np.clip(below.astype(np.intp), 0, last[:, None])
+    a = sorted_values[starts[:, None] + below]
+    b = sorted_values[starts[:, None] + np.minimum(below + 1, last[:, None])]
+    diff = b - a
+    quantiles = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+
+    mins = sorted_values[starts]
+    maxs = sorted_values[starts + last]
+    empty = n == 0
+    quantiles[empty] = np.nan
+    mins[empty] = np.nan
+    maxs[empty] = np.nan
+    return quantiles, mins, maxs
+
+
+def _plan_attribute(name):
+    """Attribut d'ElectreTri dont la réaffectation invalide le plan compilé."""
+    private = "_" + name
+
+    def getter(self):
+        return getattr(self, private)
+
+    def setter(self, value):
+        setattr(self, private, value)
+        self._plan = None
+
+    return property(getter, setter)
+
+
+class ScoringPlan:
+    """
+    Paramètres d'un ElectreTri figés en tableaux contigus (ordre des critères,
+    signes des directions, seuils, poids, profils) pour scorer un produit
+    sans passer par les dict ni par pandas.
+    Avec s = +1/-1 selon la direction, a + p >= b (resp. a - p <= b)
+    s'écrit s*a + p >= s*b : une seule comparaison pour tous les critères.
+    En mode crédibilité, concordances renvoie sigma(a, pi_k) et sigma(pi_k, a).
+    Avec des profils par groupe, profile_sets empile les profils de chaque
+    groupe (ordre de groups) puis les profils globaux (groupe inconnu).
+    """
+    __slots__ = ("criteria", "signs", "thresholds", "weights", "signed_profiles", "labels",
+                 "credibility", "indifference", "vetoes", "linear", "veto_columns",
+                 "groups", "group_slots", "profile_sets", "signed_profile_sets")
+
+    def __init__(self, model):
+        self.criteria = tuple(model.criteria)
+        self.signs = np.array([1.0 if model.directions[c] == 1 else -1.0 for c in self.criteria])
+        self.indifference, self.thresholds, self.vetoes = model._threshold_arrays()
+        self.weights = np.array([model.weights[c] for c in self.criteria])
+        self.signed_profiles = np.ascontiguousarray(model._profiles_array() * self.signs)
+        self.labels = tuple(model.category_labels)
+        self.credibility = model.credibility
+        self.linear = self.thresholds > self.indifference
+        self.veto_columns = np.flatnonzero(np.isfinite(self.vetoes))
+
+        self.groups = self.group_slots = self.profile_sets = self.signed_profile_sets = None
+        if model.group_profiles is not None:
+            table = model.group_profiles[list(self.criteria)]
+            self.groups = pd.Index(table.index.get_level_values(0)[::6])
+            self.group_slots = {g: i for i, g in enumerate(self.groups)}
+            sets = table.to_numpy(dtype=float).reshape(len(self.groups), 6, len(self.criteria))
+            self.profile_sets = np.concatenate([sets, model._profiles_array()[None]])
+            self.signed_profile_sets = self.profile_sets * self.signs
+
+    def slots(self, groups):
+        """Indice du jeu de profils de chaque groupe (profils globaux si inconnu)."""
+        slots = self.groups.get_indexer(pd.Index(groups))
+        slots[slots < 0] = len(self.groups)
+        return slots
+
+    def _signed_profiles(self, group):
+        if group is None or self.group_slots is None:
+            return self.signed_profiles
+        return self.signed_profile_sets[self.group_slots.get(group, len(self.groups))]
+
+    def _credibility(self, sa, sb):
+        """
+        sigma(a, b) pour les valeurs signées sa, sb (6 x m) : mêmes formules que
+        _credibility, mais vectorisées sur les critères (cumsum et prod
+        séquentiels : valeurs identiques).
+        """
+        q, p = self.indifference, self.thresholds
+        adv = sb - sa                    # avance de b sur a
+        with np.errstate(divide="ignore", invalid="ignore"):
+            partial = np.where(self.linear, np.clip((p - adv) / (p - q), 0.0, 1.0), sa + p >= sb)
+        C = (partial * self.weights).cumsum(axis=1)[:, -1]
+        if len(self.veto_columns) == 0:
+            return C
+        cols = self.veto_columns
+        adv, p, v = adv[:, cols], p[cols], self.vetoes[cols]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            d = np.where(v > p, np.clip((adv - p) / (v - p), 0.0, 1.0), adv >= v)
+            factors = np.where(d > C[:, None], (1.0 - d) / (1.0 - C[:, None]), 1.0)
+        return C * factors.prod(axis=1)
+
+    def concordances(self, values, group=None):
+        """
+        C(a, pi_k) et C(pi_k, a) pour k = 1..6 (values dans l'ordre des critères),
+        avec les profils de group s'il y a des profils par groupe.
+        """
+        sa = self.signs * np.asarray(values, dtype=float)
+        signed_profiles = self._signed_profiles(group)
+        if self.credibility:
+            sa = np.broadcast_to(sa, signed_profiles.shape)
+            return self._credibility(sa, signed_profiles), self._credibility(signed_profiles, sa)
+        # cumsum : somme séquentielle, identique à l'accumulation de _concordance
+        c_ap = ((sa + self.thresholds >= signed_profiles) * self.weights).cumsum(axis=1)[:, -1]
+        c_pa = ((signed_profiles + self.thresholds >= sa) * self.weights).cumsum(axis=1)[:, -1]
+        return c_ap, c_pa
+
+    def assign(self, values, lambd, group=None):
+        """(catégorie pessimiste, catégorie optimiste) d'un produit."""
+        c_ap, c_pa = self.concordances(values, group)
+        outranks = (c_ap >= lambd).tolist()
+        outranked = (c_pa >= lambd).tolist()
+
+        pess = self.labels[0]
+        for k in range(5, 0, -1):
+            if outranks[k - 1]:
+                pess = self.labels[k - 1]
+                break
+
+        opt = self.labels[-1]
+        for k in range(2, 7):
+            if outranked[k - 1] and not outranks[k - 1]:
+                opt = self.labels[k - 2]
+                break
+        return pess, opt
+
+
 class ElectreTri:
+    # Toute réaffectation de ces attributs invalide le plan compilé
+    # (une modification en place demande un appel explicite à compile()).
+    criteria = _plan_attribute("criteria")
+    directions = _plan_attribute("directions")
+    weights = _plan_attribute("weights")
+    category_labels = _plan_attribute("category_labels")
+    preference_thresholds = _plan_attribute("preference_thresholds")
+    indifference_thresholds = _plan_attribute("indifference_thresholds")
+    veto_thresholds = _plan_attribute("veto_thresholds")
+    credibility = _plan_attribute("credibility")
+    profiles = _plan_attribute("profiles")
+    group_col = _plan_attribute("group_col")
+    group_profiles = _plan_attribute("group_profiles")
+
+    # groupe des profils globaux dans les fichiers de save_profiles
+    GLOBAL_GROUP = "*"
+
+    # produits traités par tuile (concordances / crédibilités d'une tuile à la fois)
+    TILE_ROWS = 1 << 16
+
     def __init__(self, criteria, directions, weights,
                  category_labels=None, lambdas=(0.6, 0.7),
-                 preference_thresholds=None):
+                 preference_thresholds=None, indifference_thresholds=None,
+                 veto_thresholds=None, credibility=None, group_col=None, min_group_size=1):
         """
         criteria: liste des noms de colonnes
         directions: dict crit -> 1 (plus c'est grand mieux) ou -1
@@ -36,6 +495,15 @@ class ElectreTri:
         category_labels: labels des catégories ELECTRE
         lambdas: valeurs de lambda testées
         preference_thresholds: dict crit -> seuil de préférence p
+        indifference_thresholds: dict crit -> seuil d'indifférence q (défaut : p)
+        veto_thresholds: dict crit -> seuil de veto v (défaut : pas de veto)
+        credibility: affectation sur l'indice de crédibilité ELECTRE TRI-B
+            (q/p/v) au lieu de la concordance simple ; par défaut activé dès
+            que des seuils q ou v sont donnés
+        group_col: colonne de regroupement (ex. "Categorie") : build_limiting_profiles
+            construit aussi des profils par groupe et chaque produit est comparé
+            aux profils de son groupe (globaux si le groupe est inconnu)
+        min_group_size: groupes plus petits comparés aux profils globaux
         """
         self.criteria = criteria
         self.directions = directions
@@ -45,7 +513,52 @@ class ElectreTri:
         self.preference_thresholds = preference_thresholds or {
             c: 0.0 for c in criteria
         }
+        self.indifference_thresholds = indifference_thresholds or {}
+        self.veto_thresholds = veto_thresholds or {}
+        if credibility is None:
+            credibility = bool(indifference_thresholds or veto_thresholds)
+        self.credibility = credibility
+        self._threshold_arrays()  # vérifie q <= p <= v
         self.profiles = None  # sera construit à partir du df
+        self.group_col = group_col
+        self.min_group_size = min_group_size
+        self.group_profiles = None  # index (groupe, profil), cf. build_group_profiles
+
+    @instrumented()
+    def compile(self):
+        """Fige les paramètres et les profils dans un ScoringPlan."""
+        if self.profiles is None:
+            raise ValueError("Profils non construits : appeler build_limiting_profiles.")
+        self._plan = ScoringPlan(self)
+        return self._plan
+
+    @property
+    def plan(self):
+        """Plan compilé, reconstruit si un paramètre a changé depuis."""
+        if self._plan is None:
+            return self.compile()
+        return self._plan
+
+    def assign_one(self, values, lambd, group=None):
+        """
+        Affectations (pessimiste, optimiste) d'un seul produit via le plan compilé.
+        values : dict/Series crit -> valeur, ou séquence dans l'ordre des critères
+        group : groupe du produit (lu dans values[group_col] si absent)
+        """
+        if hasattr(values, "keys"):
+            if group is None and self.group_col is not None and self.group_col in values:
+                group = values[self.group_col]
+            values = [values[c] for c in self.plan.criteria]
+        return self.plan.assign(values, lambd, group)
+
+    def _threshold_arrays(self):
+        """Seuils (q, p, v) dans l'ordre des critères ; v = inf sans veto."""
+        p = np.array([self.preference_thresholds.get(c, 0.0) for c in self.criteria], dtype=float)
+        q = np.array([self.indifference_thresholds.get(c, p[j]) for j, c in enumerate(self.criteria)], dtype=float)
+        v = np.array([self.veto_thresholds.get(c, np.inf) for c in self.criteria], dtype=float)
+        if (q > p).any() or (p > v).any():
+            raise ValueError("Seuils incohérents : il faut q <= p <= v pour chaque critère.")
+        return q, p, v
 
     @staticmethod
     def _normalize_weights(weights):
@@ -78,17 +591,21 @@ class ElectreTri:
         """a ≻ b si a S b et non (b S a)."""
         return self._outranks(a, b, lambd) and not self._outranks(b, a, lambd)
 
-    def build_limiting_profiles(self, df, eps=1e-6):
+    def _profiles_from_stats(self, stats, eps=1e-6):
         """
-        Construit les profils pi1..pi6 à partir des quantiles de df.
+        Profils pi1..pi6 (self.profiles) à partir de, pour chaque critère,
+        (q20, q40, q60, q80, min, max).
         """
+        self.profiles = self._profiles_table(stats, eps)
+        return self.profiles
+
+    def _profiles_table(self, stats, eps=1e-6):
+        """Table des profils pi1..pi6 pour les statistiques stats (cf. _profiles_from_stats)."""
         profiles_index = [f"pi{k}" for k in range(1, 7)]
         profiles = pd.DataFrame(index=profiles_index, columns=self.criteria, dtype=float)
 
         for crit in self.criteria:
-            col = df[crit].astype(float)
-            q20, q40, q60, q80 = col.quantile([0.2, 0.4, 0.6, 0.8])
-            cmin, cmax = col.min(), col.max()
+            q20, q40, q60, q80, cmin, cmax = stats[crit]
 
             if self.directions[crit] == 1:
                 profiles.loc["pi1", crit] = cmin - eps
@@ -105,9 +622,217 @@ class ElectreTri:
                 profiles.loc["pi5", crit] = q20
                 profiles.loc["pi6", crit] = cmin - eps
 
-        self.profiles = profiles
         return profiles
 
+    @instrumented()
+    def build_limiting_profiles(self, df, eps=1e-6):
+        """
+        Construit les profils pi1..pi6 à partir des quantiles de df
+        (et les profils par groupe si group_col est défini).
+        """
+        stats = {}
+        for crit in self.criteria:
+            col = df[crit].astype(float)
+            q20, q40, q60, q80 = col.quantile([0.2, 0.4, 0.6, 0.8])
+            stats[crit] = (q20, q40, q60, q80, col.min(), col.max())
+
+        profiles = self._profiles_from_stats(stats, eps)
+        if self.group_col is not None:
+            self.build_group_profiles(df, eps=eps)
+        return profiles
+
+    @instrumented()
+    def build_group_profiles(self, df, group_col=None, eps=1e-6, min_size=None):
+        """
+        Profils pi1..pi6 pour chaque valeur de group_col, en une passe groupée :
+        un tri (groupe, valeur) par critère donne les quantiles de tous les
+        groupes à la fois (mêmes valeurs que build_limiting_profiles appliqué à
+        chaque groupe). Les groupes de moins de min_size produits ne sont pas
+        gardés ; eux et les groupes inconnus utilisent les profils globaux.
+        Retourne group_profiles : index (groupe, profil), colonnes critères.
+        """
+        group_col = group_col or self.group_col
+        min_size = self.min_group_size if min_size is None else min_size
+        codes, groups = pd.factorize(df[group_col], sort=True)   # groupe manquant : -1
+        known = codes >= 0
+        codes = codes[known]
+        kept = np.bincount(codes, minlength=len(groups)) >= min_size
+
+        sets = np.empty((len(groups), 6, len(self.criteria)))
+        for j, crit in enumerate(self.criteria):
+            values = df[crit].to_numpy(dtype=float)[known]
+            quantiles, cmin, cmax = _grouped_quantiles(codes, len(groups), values, [0.2, 0.4, 0.6, 0.8])
+            q20, q40, q60, q80 = quantiles.T
+            # même construction que _profiles_from_stats
+            if self.directions[crit] == 1:
+                column = [cmin - eps, q20, q40, q60, q80, cmax + eps]
+            else:
+                column = [cmax + eps, q80, q60, q40, q20, cmin - eps]
+            sets[:, :, j] = np.stack(column, axis=1)
+
+        groups = groups[kept]
+        index = pd.MultiIndex.from_product([groups, [f"pi{k}" for k in range(1, 7)]],
+                                           names=[group_col, "profil"])
+        self.group_col = group_col
+        self.group_profiles = pd.DataFrame(sets[kept].reshape(-1, len(self.criteria)),
+                                           index=index, columns=self.criteria)
+        return self.group_profiles
+
+    def new_profile_sketches(self, k=200, rank_error=None, seed=0):
+        """
+        Un QuantileSketch par critère (k ou erreur de rang visée rank_error).
+        """
+        if rank_error is not None:
+            return {c: QuantileSketch.for_error(rank_error, seed=seed) for c in self.criteria}
+        return {c: QuantileSketch(k=k, seed=seed) for c in self.criteria}
+
+    @instrumented()
+    def update_profile_sketches(self, sketches, df):
+        """Alimente les sketches avec un bloc de produits."""
+        for crit in self.criteria:
+            sketches[crit].update(df[crit].to_numpy(dtype=float))
+        return sketches
+
+    @instrumented()
+    def update_group_profile_sketches(self, group_sketches, df, group_col=None, k=200,
+                                      rank_error=None, seed=0):
+        """
+        Alimente les sketches par groupe avec un bloc de produits :
+        group_sketches : dict groupe -> sketches par critère (new_profile_sketches),
+        complété à la première rencontre d'un groupe. Les lignes sans groupe sont ignorées.
+        Mémoire : O(nombre de groupes x k), quel que soit le nombre de lignes.
+        """
+        group_col = group_col or self.group_col
+        codes, groups = pd.factorize(df[group_col])
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(groups) + 1))
+        X = self._criteria_array(df)[order]
+        for g, group in enumerate(groups):
+            sketches = group_sketches.get(group)
+            if sketches is None:
+                sketches = group_sketches[group] = self.new_profile_sketches(k, rank_error, seed)
+            rows = slice(bounds[g], bounds[g + 1])
+            for j, crit in enumerate(self.criteria):
+                sketches[crit].update(X[rows, j])
+        return group_sketches
+
+    @staticmethod
+    def _sketch_stats(sketches, criteria):
+        stats = {}
+        for crit in criteria:
+            sketch = sketches[crit]
+            q20, q40, q60, q80 = sketch.quantile([0.2, 0.4, 0.6, 0.8])
+            stats[crit] = (q20, q40, q60, q80, sketch.min, sketch.max)
+        return stats
+
+    @instrumented()
+    def build_limiting_profiles_from_sketches(self, sketches, eps=1e-6):
+        """
+        Construit les profils pi1..pi6 à partir des sketches (approximatif,
+        exact tant qu'aucun sketch n'a été compacté). min/max restent exacts.
+        """
+        return self._profiles_from_stats(self._sketch_stats(sketches, self.criteria), eps)
+
+    @instrumented()
+    def build_group_profiles_from_sketches(self, group_sketches, group_col=None, eps=1e-6, min_size=None):
+        """
+        Profils par groupe (même table que build_group_profiles) à partir des
+        sketches de update_group_profile_sketches : exacts pour les groupes dont
+        les sketches n'ont pas été compactés (moins de k produits), approximatifs
+        au-delà. Les groupes de moins de min_size produits ne sont pas gardés.
+        """
+        group_col = group_col or self.group_col
+        min_size = self.min_group_size if min_size is None else min_size
+        groups = pd.Index(list(group_sketches)).sort_values()
+        kept = [g for g in groups
+                if max(s.n for s in group_sketches[g].values()) >= min_size]
+        tables = [self._profiles_table(self._sketch_stats(group_sketches[g], self.criteria), eps)
+                  for g in kept]
+        index = pd.MultiIndex.from_product([kept, [f"pi{k}" for k in range(1, 7)]],
+                                           names=[group_col, "profil"])
+        values = (np.concatenate([t.to_numpy(dtype=float) for t in tables])
+                  if tables else np.empty((0, len(self.criteria))))
+        self.group_col = group_col
+        self.group_profiles = pd.DataFrame(values, index=index, columns=self.criteria)
+        return self.group_profiles
+
+    def save_profiles(self, path):
+        """
+        Sauvegarde les profils pi1..pi6 (csv) pour les réutiliser sans le dataset.
+        Avec des profils par groupe : une ligne par (groupe, profil), les
+        profils globaux sous le groupe GLOBAL_GROUP ; le type des groupes est
+        noté dans l'en-tête ("profil:int64") pour être restauré à la lecture.
+        """
+        if self.group_profiles is None:
+            self.profiles.to_csv(path)
+        else:
+            dtype = self.group_profiles.index.levels[0].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                dtype = dtype.categories.dtype
+            global_profiles = pd.concat({self.GLOBAL_GROUP: self.profiles})
+            table = pd.concat([global_profiles, self.group_profiles])
+            table.index.names = [self.group_col, f"profil:{dtype}"]
+            table.to_csv(path)
+
+    def read_profiles(self, path):
+        """
+        Lit un fichier de save_profiles : (profils globaux, profils par groupe
+        ou None, colonne de regroupement ou None).
+        """
+        header = pd.read_csv(path, nrows=0).columns
+        profile_col, _, dtype = header[1].partition(":") if len(header) >= 2 else ("", "", "")
+        if profile_col != "profil":
+            profiles = pd.read_csv(path, index_col=0, float_precision="round_trip")
+            return profiles[self.criteria].astype(float), None, None
+        table = pd.read_csv(path, index_col=[0, 1], dtype={header[0]: str},
+                            float_precision="round_trip")[self.criteria].astype(float)
+        is_global = table.index.get_level_values(0) == self.GLOBAL_GROUP
+        profiles = table[is_global].droplevel(0)
+        profiles.index.name = None
+
+        # groupes relus en texte : retour au type d'origine (1 et non '1')
+        group_profiles = table[~is_global]
+        groups = group_profiles.index.get_level_values(0)
+        if dtype == "bool":
+            groups = groups.map({"True": True, "False": False})
+        elif dtype:
+            groups = groups.astype(dtype)
+        group_profiles.index = pd.MultiIndex.from_arrays(
+            [groups, group_profiles.index.get_level_values(1)], names=[header[0], "profil"])
+        return profiles, group_profiles, header[0]
+
+    def load_profiles(self, path):
+        """Recharge des profils sauvegardés par save_profiles (par groupe compris)."""
+        self.profiles, group_profiles, group_col = self.read_profiles(path)
+        if group_profiles is not None:
+            self.group_col = group_col
+        self.group_profiles = group_profiles
+        return self.profiles
+
+    def profile_drift(self, reference, reference_groups=None):
+        """
+        Écart maximal entre self.profiles et des profils de référence, relatif
+        à l'étendue (pi1..pi6) de la référence pour chaque critère.
+        0 = profils identiques ; 0.05 = un seuil a bougé de 5 % de l'étendue.
+        Les profils par groupe sont comparés de même ; inf si les groupes diffèrent.
+        """
+        ref = reference[self.criteria].to_numpy(dtype=float)
+        cur = self.profiles[self.criteria].to_numpy(dtype=float)
+        span = np.abs(ref[-1] - ref[0])
+        span[span == 0] = 1.0
+        drift = float((np.abs(cur - ref) / span).max())
+
+        if self.group_profiles is None and reference_groups is None:
+            return drift
+        if (self.group_profiles is None or reference_groups is None
+                or not self.group_profiles.index.equals(reference_groups.index)):
+            return np.inf
+        ref = reference_groups[self.criteria].to_numpy(dtype=float).reshape(-1, 6, len(self.criteria))
+        cur = self.group_profiles[self.criteria].to_numpy(dtype=float).reshape(ref.shape)
+        span = np.abs(ref[:, -1] - ref[:, 0])[:, None, :]
+        span[span == 0] = 1.0
+        return max(drift, float((np.abs(cur - ref) / span).max(initial=0.0)))
+
     def _assign_pessimistic_row(self, row, lambd):
         """Affectation pessimiste d’une seule alternative."""
         assigned_cat = self.category_labels[0]  # pire catégorie par défaut
@@ -128,66 +853,406 @@ class ElectreTri:
                 break
         return assigned_cat
 
+    def _criteria_array(self, df):
+        """Matrice (n_produits x n_critères) des valeurs, en float."""
+        return df[self.criteria].to_numpy(dtype=float)
+
+    def _profiles_array(self):
+        """Matrice (6 x n_critères) des profils pi1..pi6."""
+        return self.profiles[self.criteria].to_numpy(dtype=float)
+
+    def _profile_groups(self, df):
+        """
+        Jeu de profils de chaque produit de df (indices de plan.profile_sets),
+        None sans profils par groupe.
+        """
+        if self.group_profiles is None:
+            return None
+        return self.plan.slots(df[self.group_col])
+
+    @instrumented()
+    def concordance_matrices(self, df):
+        """
+        Calcule en une fois C(a, pi_k) et C(pi_k, a) pour tous les produits
+        et tous les profils.
+        Retourne deux matrices (n_produits x 6), colonne k-1 <-> pi_k.
+        """
+        return self._concordance_arrays(self._criteria_array(df), self._profile_groups(df))
+
+    @instrumented()
+    def outranking_matrices(self, df):
+        """
+        Matrices (n_produits x 6) utilisées pour l'affectation : concordances
+        (concordance_matrices) ou, en mode crédibilité, sigma(a, pi_k) et sigma(pi_k, a).
+        """
+        return self._outranking_arrays(self._criteria_array(df), self._profile_groups(df))
+
+    def _outranking_arrays(self, X, groups=None):
+        if self.credibility:
+            return self._credibility_arrays(X, groups)
+        return self._concordance_arrays(X, groups)
+
+    def _credibility_arrays(self, X, groups=None):
+        """Indices de crédibilité ELECTRE TRI-B (cf. _credibility) pour la matrice X."""
+        signs = np.array([1.0 if self.directions[c] == 1 else -1.0 for c in self.criteria])
+        weights = np.array([self.weights[c] for c in self.criteria])
+        q, p, v = self._threshold_arrays()
+        if groups is None:
+            return _credibility(X * signs, self._profiles_array() * signs, weights, q, p, v)
+        return _credibility(X * signs, self.plan.signed_profile_sets, weights, q, p, v, groups)
+
+    def _concordance_arrays(self, X, groups=None):
+        """concordance_matrices à partir de la matrice des critères."""
+        shape = (X.shape[0], self.profiles.shape[0])
+        c_ap = np.zeros(shape)
+        c_pa = np.zeros(shape)
+        # On accumule critère par critère, dans le même ordre que _concordance,
+        # pour obtenir exactement les mêmes sommes flottantes.
+        for crit, ci_ap, ci_pa in self._iter_partial_concordances(X, groups=groups):
+            c_ap += self.weights[crit] * ci_ap
+            c_pa += self.weights[crit] * ci_pa
+        return c_ap, c_pa
+
+    def _iter_partial_concordances(self, X, preference_thresholds=None, groups=None):
+        """
+        Pour chaque critère : (crit, C_i(a, pi_k), C_i(pi_k, a)), matrices
+        booléennes (n_produits x 6). Elles ne dépendent pas des poids.
+        groups : jeu de profils de chaque produit (cf. _profile_groups) ; les
+        profils sont alors pris critère par critère, (n_produits x 6).
+        """
+        thresholds = self.preference_thresholds if preference_thresholds is None else preference_thresholds
+        P = self._profiles_array() if groups is None else self.plan.profile_sets
+        for j, crit in enumerate(self.criteria):
+            p = thresholds.get(crit, 0.0)
+            a_val = X[:, j, None]                                   # (n, 1)
+            b_val = P[:, j] if groups is None else P[groups, :, j]  # (6,) ou (n, 6)
+            if self.directions[crit] == 1:
+                yield crit, a_val + p >= b_val, b_val + p >= a_val
+            else:
+                yield crit, a_val - p <= b_val, b_val - p <= a_val
+
+    @staticmethod
+    def _pessimistic_indices(c_ap, lambd):
+        """
+        Indice de catégorie pessimiste : plus grand k (5..1) tel que a S pi_k,
+        0 (pire catégorie) sinon.
+        """
+        outranks = c_ap[:, 4::-1] >= lambd     # pi5, pi4, ..., pi1
+        first = outranks.argmax(axis=1)
+        return np.where(outranks.any(axis=1), 4 - first, 0)
+
+    def _optimistic_indices(self, c_ap, c_pa, lambd):
+        """
+        Indice de catégorie optimiste : plus petit k (2..6) tel que pi_k ≻ a,
+        meilleure catégorie sinon.
+        """
+        preferred = (c_pa[:, 1:] >= lambd) & ~(c_ap[:, 1:] >= lambd)  # pi2..pi6
+        first = preferred.argmax(axis=1)
+        return np.where(preferred.any(axis=1), first, len(self.category_labels) - 1)
+
+    def _labels_series(self, indices, df):
+        labels = np.asarray(self.category_labels, dtype=object)
+        return pd.Series(labels[indices], index=df.index)
+
+    @instrumented()
     def assign_pessimistic(self, df, lambd):
-        return df.apply(lambda row: self._assign_pessimistic_row(row, lambd), axis=1)
+        c_ap, _ = self.outranking_matrices(df)
+        return self._labels_series(self._pessimistic_indices(c_ap, lambd), df)
 
+    @instrumented()
     def assign_optimistic(self, df, lambd):
-        return df.apply(lambda row: self._assign_optimistic_row(row, lambd), axis=1)
+        c_ap, c_pa = self.outranking_matrices(df)
+        return self._labels_series(self._optimistic_indices(c_ap, c_pa, lambd), df)
+
+    @staticmethod
+    def lambda_grid(start=0.5, stop=0.95, step=0.01):
+        """
+        Grille de lambda [start, stop] (bornes incluses), arrondie pour que
+        les noms de colonnes restent lisibles (ELECTRE_Pess_0.57, ...).
+        """
+        n = int(round((stop - start) / step)) + 1
+        return tuple(np.round(start + step * np.arange(n), 10).tolist())
+
+    @staticmethod
+    def _confusion_df(y_true, y_pred):
+        """Matrice de confusion NutriScore réel x catégorie ELECTRE."""
+        acc = ConfusionAccumulator().update(ConfusionAccumulator.encode(y_true),
+                                            {"pred": ConfusionAccumulator.encode(y_pred)})
+        return acc.frame("pred")
+
+    def _grade_codes(self):
+        """Code A..E (0..4) de chaque catégorie ELECTRE, -1 si hors A..E."""
+        return ConfusionAccumulator.encode(self.category_labels)
+
+    def _confusion_accumulator(self, indices, true_codes, acc=None):
+        """Matrices de confusion des colonnes d'indices (sans passer par les lettres)."""
+        codes = self._grade_codes()
+        acc = ConfusionAccumulator() if acc is None else acc
+        return acc.update(true_codes, {c: codes[idx] for c, idx in indices.items()})
+
+    def _labels_frame(self, indices, index):
+        labels = np.asarray(self.category_labels, dtype=object)
+        return pd.DataFrame({colname: labels[idx] for colname, idx in indices.items()}, index=index)
+
+    def _sweep_labels(self, df, lambdas):
+        """
+        Colonnes ELECTRE_Pess_/ELECTRE_Opt_ pour chaque lambda.
+        Les concordances ne dépendent pas de lambda : elles sont calculées
+        une seule fois, seul le seuillage est refait pour chaque valeur.
+        """
+        indices = self._sweep_indices(self._criteria_array(df), lambdas, self._profile_groups(df))
+        return self._labels_frame(indices, df.index)
+
+    def _sweep_indices(self, X, lambdas, groups=None):
+        """
+        Indices de catégorie (int8, pess/opt pour chaque lambda) pour la matrice X
+        (groups : jeu de profils de chaque ligne, cf. _profile_groups).
+        Les produits sont traités par tuiles de TILE_ROWS : seuls les indices
+        sont de taille n, les matrices (tuile x 6) restent bornées.
+        """
+        indices = {}
+        for lambd in lambdas:
+            indices[f"ELECTRE_Pess_{lambd}"] = np.empty(len(X), dtype=np.int8)
+            indices[f"ELECTRE_Opt_{lambd}"] = np.empty(len(X), dtype=np.int8)
 
-    def apply_and_confusion(self, df, target_col="NutriScore_Lettre"):
+        # une seule mesure pour toutes les tuiles et tous les lambda
+        with stage("ElectreTri.sweep_indices", rows=len(X)):
+            for start in range(0, len(X), self.TILE_ROWS):
+                tile = slice(start, start + self.TILE_ROWS)
+                c_ap, c_pa = self._outranking_arrays(X[tile], None if groups is None else groups[tile])
+                for lambd in lambdas:
+                    indices[f"ELECTRE_Pess_{lambd}"][tile] = self._pessimistic_indices(c_ap, lambd)
+                    indices[f"ELECTRE_Opt_{lambd}"][tile] = self._optimistic_indices(c_ap, c_pa, lambd)
+        return indices
+
+    @instrumented()
+    def sweep_lambdas(self, df, lambdas=None, target_col="NutriScore_Lettre"):
+        """
+        Balayage d'une grille de lambda (par défaut self.lambdas).
+        Les profils sont construits s'ils ne l'ont pas encore été.
+        Retourne :
+            * un DataFrame des colonnes ELECTRE (pess/opt pour chaque lambda)
+            * dict nom de colonne -> matrice de confusion
+        """
+        if lambdas is None:
+            lambdas = self.lambdas
+        if self.profiles is None:
+            self.build_limiting_profiles(df)
+
+        indices = self._sweep_indices(self._criteria_array(df), lambdas, self._profile_groups(df))
+        acc = self._confusion_accumulator(indices, ConfusionAccumulator.encode(df[target_col]))
+        return self._labels_frame(indices, df.index), acc.frames()
+
+    @instrumented()
+    def sweep_confusions(self, df, lambdas=None, target_col="NutriScore_Lettre", chunksize=100_000):
+        """
+        Matrices de confusion seules (ConfusionAccumulator) pour une grille de
+        lambda, par blocs de chunksize lignes : aucune colonne de lettres n'est
+        créée, la mémoire ne dépend pas de la taille de la grille.
+        Les profils sont construits s'ils ne l'ont pas encore été.
+        """
+        if lambdas is None:
+            lambdas = self.lambdas
+        if self.profiles is None:
+            self.build_limiting_profiles(df)
+
+        acc = ConfusionAccumulator()
+        true_codes = ConfusionAccumulator.encode(df[target_col])
+        groups = self._profile_groups(df)
+        for start in range(0, len(df), chunksize):
+            rows = slice(start, start + chunksize)
+            X = self._criteria_array(df.iloc[rows])
+            self._confusion_accumulator(self._sweep_indices(X, lambdas, None if groups is None else groups[rows]),
+                                        true_codes[rows], acc)
+        return acc
+
+    def _sweep_parallel(self, df, lambdas, target_col, n_jobs, n_partitions=None):
+        """
+        _sweep_labels + matrices de confusion, découpé en partitions de lignes
+        traitées dans un pool de processus. Le modèle (profils, poids) n'est
+        envoyé qu'une fois par worker ; les partitions sont réassemblées dans
+        l'ordre et les matrices partielles sommées.
+        """
+        n_jobs = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+        n_partitions = n_partitions or 4 * n_jobs
+
+        X = self._criteria_array(df)
+        y = ConfusionAccumulator.encode(df[target_col])
+        groups = self._profile_groups(df)
+        bounds = np.linspace(0, len(df), n_partitions + 1).astype(int)
+        tasks = [(X[a:b], y[a:b], None if groups is None else groups[a:b])
+                 for a, b in zip(bounds[:-1], bounds[1:])]
+
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_electre_worker,
+                                 initargs=(self, tuple(lambdas))) as executor:
+            results = list(executor.map(_score_electre_partition, tasks))
+
+        colnames = list(results[0][0])
+        indices = {c: np.concatenate([r[0][c] for r in results]) for c in colnames}
+        acc = ConfusionAccumulator(colnames)
+        for _, partial in results:
+            acc.merge(partial)
+        return self._labels_frame(indices, df.index), acc
+
+    @instrumented()
+    def apply_and_confusion(self, df, target_col="NutriScore_Lettre", n_jobs=1, n_partitions=None):
         """
         1) Construit les profils
         2) Ajoute les colonnes ELECTRE (pess/opt pour chaque lambda)
         3) Calcule les matrices de confusion
+        n_jobs > 1 (ou -1 pour tous les coeurs) : étapes 2 et 3 en multi-processus.
         """
         # 1. Profils
         self.build_limiting_profiles(df)
 
-        confusion_results = {}
-        labels_true = ["A", "B", "C", "D", "E"]
-        pred_cols = ["A'", "B'", "C'", "D'", "E'"]
-
-        for lambd in self.lambdas:
-            # Pessimiste
-            colname_pess = f"ELECTRE_Pess_{lambd}"
-            pess = self.assign_pessimistic(df, lambd)
-            df = add_column_if_missing(df, colname_pess, pess)
-
-            cm_pess = confusion_matrix(
-                df[target_col],
-                df[colname_pess],
-                labels=labels_true
-            )
-            confusion_results[colname_pess] = pd.DataFrame(
-                cm_pess,
-                index=[f"NS_{l}" for l in labels_true],
-                columns=pred_cols
+        # 2. Affectations pour tous les lambda en une passe, et 3. matrices de
+        # confusion de toutes les colonnes en un seul comptage
+        if n_jobs == 1:
+            indices = self._sweep_indices(self._criteria_array(df), self.lambdas, self._profile_groups(df))
+            labels = self._labels_frame(indices, df.index)
+            with stage("ElectreTri.confusion_matrix", rows=len(df)):
+                acc = self._confusion_accumulator(indices, ConfusionAccumulator.encode(df[target_col]))
+        else:
+            labels, acc = self._sweep_parallel(
+                df, self.lambdas, target_col, n_jobs, n_partitions
             )
 
-            # Optimiste
-            colname_opt = f"ELECTRE_Opt_{lambd}"
-            opt = self.assign_optimistic(df, lambd)
-            df = add_column_if_missing(df, colname_opt, opt)
-
-            cm_opt = confusion_matrix(
-                df[target_col],
-                df[colname_opt],
-                labels=labels_true
-            )
-            confusion_results[colname_opt] = pd.DataFrame(
-                cm_opt,
-                index=[f"NS_{l}" for l in labels_true],
-                columns=pred_cols
-            )
+        confusion_results = {}
+        for colname in labels.columns:
+            is_new = colname not in df.columns
+            df = add_column_if_missing(df, colname, labels[colname])
+            if is_new:
+                confusion_results[colname] = acc.frame(colname)
+            else:
+                # colonne existante conservée : matrice de ses propres valeurs
+                confusion_results[colname] = self._confusion_df(df[target_col], df[colname])
 
         return df, confusion_results
 
+    def sample_weights(self, method="dirichlet", n=1000, seed=0, levels=(1, 2, 3), alpha=1.0):
+        """
+        Vecteurs de poids candidats (n_candidats x n_critères, normalisés) :
+        - "grid" : toutes les combinaisons de `levels` par critère
+        - "dirichlet" : n tirages Dirichlet(alpha)
+        - "lhs" : n points d'un hypercube latin sur [0, 1]^m
+        """
+        m = len(self.criteria)
+        rng = np.random.default_rng(seed)
+        if method == "grid":
+            grids = np.meshgrid(*[np.asarray(levels, dtype=float)] * m, indexing="ij")
+            W = np.stack([g.ravel() for g in grids], axis=1)
+            W = W[W.sum(axis=1) > 0]
+        elif method == "dirichlet":
+            W = rng.dirichlet(np.full(m, alpha), size=n)
+        elif method == "lhs":
+            strata = np.stack([rng.permutation(n) for _ in range(m)], axis=1)
+            W = (strata + rng.random((n, m))) / n
+        else:
+            raise ValueError(f"Méthode d'échantillonnage inconnue : {method}")
+        return W / W.sum(axis=1, keepdims=True)
+
+    def _evaluate_weights(self, partial_ap, partial_pa, true_rows, W, lambdas):
+        """
+        Matrices de confusion (n_poids x n_lambda x 2 modes x 5 x 5) pour
+        chaque vecteur de poids de W, à partir des concordances partielles
+        (n_produits x 6 x m). Un candidat ne coûte qu'un produit matrice-vecteur.
+        """
+        codes = self._grade_codes()
+        out = np.zeros((len(W), len(lambdas), 2, 5, 5), dtype=np.int64)
+        for i, w in enumerate(W):
+            c_ap = np.zeros(partial_ap.shape[:2])
+            c_pa = np.zeros(partial_pa.shape[:2])
+            for j in range(len(w)):
+                c_ap += w[j] * partial_ap[:, :, j]
+                c_pa += w[j] * partial_pa[:, :, j]
+            preds = {}
+            for l, lambd in enumerate(lambdas):
+                preds[l, 0] = codes[self._pessimistic_indices(c_ap, lambd)]
+                preds[l, 1] = codes[self._optimistic_indices(c_ap, c_pa, lambd)]
+            acc = ConfusionAccumulator().update(true_rows, preds)
+            out[i] = acc.counts.reshape(len(lambdas), 2, 5, 5)
+        return out
+
+    @instrumented()
+    def sensitivity_analysis(self, df, weight_candidates, threshold_candidates=None,
+                             lambdas=None, target_col="NutriScore_Lettre",
+                             n_jobs=1, top_k=10):
+        """
+        Évalue chaque couple (seuils de préférence, vecteur de poids) pour
+        chaque lambda, en mode pessimiste et optimiste.
+        weight_candidates : tableau (n_candidats x n_critères), cf. sample_weights
+        threshold_candidates : liste de dict crit -> p (par défaut les seuils du modèle ;
+            {} = comparaison stricte, p = 0 pour tous les critères)
+        Les profils doivent être construits (build_limiting_profiles).
+        Retourne :
+            * DataFrame des résultats (une ligne par candidat, mode et lambda)
+            * tableau des matrices de confusion aligné sur les lignes
+            * DataFrame des top_k configurations par accuracy
+        """
+        if self.credibility:
+            raise ValueError("sensitivity_analysis porte sur la concordance simple (credibility=False).")
+        if lambdas is None:
+            lambdas = self.lambdas
+        if threshold_candidates is None:
+            threshold_candidates = [self.preference_thresholds]
+        W = np.asarray(weight_candidates, dtype=float)
+        W = W / W.sum(axis=1, keepdims=True)
+        n_jobs = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+
+        X = self._criteria_array(df)
+        groups = self._profile_groups(df)
+        true_rows = ConfusionAccumulator.encode(df[target_col])
+
+        rows, confusions = [], []
+        for t_id, thresholds in enumerate(threshold_candidates):
+            partials = list(self._iter_partial_concordances(X, thresholds, groups))
+            partial_ap = np.stack([p[1] for p in partials], axis=2)
+            partial_pa = np.stack([p[2] for p in partials], axis=2)
+
+            if n_jobs == 1:
+                cms = self._evaluate_weights(partial_ap, partial_pa, true_rows, W, lambdas)
+            else:
+                blocks = np.array_split(W, min(len(W), 4 * n_jobs))
+                with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_sensitivity_worker,
+                                         initargs=(self, partial_ap, partial_pa, true_rows,
+                                                   tuple(lambdas))) as executor:
+                    cms = np.concatenate(list(executor.map(_evaluate_weight_block, blocks)))
+
+            for w_id in range(len(W)):
+                for l, lambd in enumerate(lambdas):
+                    for mode, mode_name in enumerate(("Pess", "Opt")):
+                        cm = cms[w_id, l, mode]
+                        rows.append({
+                            "threshold_id": t_id, "weights_id": w_id,
+                            "mode": mode_name, "lambda": lambd,
+                            "accuracy": np.trace(cm) / max(cm.sum(), 1),
+                            **dict(zip(self.criteria, W[w_id]))
+                        })
+                        confusions.append(cm)
+
+        results = pd.DataFrame(rows)
+        top = results.nlargest(top_k, "accuracy")
+        return results, np.array(confusions), top
+
     @staticmethod
-    def plot_confusion_matrices(confusion_results):
+    @instrumented(rows_from=None)
+    def plot_confusion_matrices(confusion_results, output_dir=None, n_jobs=None):
         """
         Affiche les matrices de confusion sous forme de heatmaps matplotlib.
         confusion_results: dict nom -> DataFrame
+        output_dir : rapport html/png écrit sans affichage (report.RunReport,
+        rendu en parallèle, figures inchangées non redessinées) au lieu de
+        plt.show() ; retourne alors le résumé du rendu.
         """
+        if output_dir is not None:
+            from report import RunReport
+
+            report = RunReport(output_dir)
+            report.add_confusions(confusion_results)
+            return report.render(n_jobs=n_jobs)
+
+        import matplotlib.pyplot as plt
+
         n = len(confusion_results)
         cols = 2
         rows = int(np.ceil(n / cols))
@@ -225,6 +1290,462 @@ class ElectreTri:
 
 
 
+# %%
+def clean_product_names(df):
+    """Retire la ponctuation de Nom_Produit."""
+    df['Nom_Produit'] = df['Nom_Produit'].str.replace(r'[^\w\s]', '', regex=True)
+    return df
+
+
+def score_dataset_streaming(input_path, output_path, model, chunksize=100_000,
+                            lambdas=None, sheet_name='Sheet1', profile_rank_error=0.005):
+    """
+    Pipeline par blocs : la mémoire dépend de chunksize, pas de la taille du dataset.
+    1) Si model.profiles n'est pas encore construit, une première passe ne lit
+       que les colonnes critères et construit les profils pi1..pi6 à partir de
+       sketches de quantiles (erreur de rang profile_rank_error) ; avec
+       model.group_col, elle lit aussi la colonne de groupe et alimente en
+       plus un jeu de sketches par groupe (exacts pour les petits groupes).
+    2) Deuxième passe, bloc par bloc : nettoyage de Nom_Produit, Nutri-Score
+       (NutriScoreEngine.calculate_many) et affectations ELECTRE pour chaque
+       lambda, puis ajout du bloc à la fin de output_path (csv).
+    Retourne le nombre de lignes écrites.
+    """
+    if lambdas is None:
+        lambdas = model.lambdas
+
+    # 1. Profils (sketches de quantiles : mémoire bornée)
+    if model.profiles is None:
+        group_col = model.group_col
+        sketches = model.new_profile_sketches(rank_error=profile_rank_error)
+        group_sketches = {}
+        columns = model.criteria + ([group_col] if group_col is not None else [])
+        for chunk in iter_dataset_chunks(input_path, chunksize, sheet_name, usecols=columns):
+            model.update_profile_sketches(sketches, chunk)
+            if group_col is not None:
+                model.update_group_profile_sketches(group_sketches, chunk, rank_error=profile_rank_error)
+        model.build_limiting_profiles_from_sketches(sketches)
+        if group_col is not None:
+            model.build_group_profiles_from_sketches(group_sketches)
+
+    # 2. Scoring bloc par bloc
+    n_rows = 0
+    chunks = iter_dataset_chunks(input_path, chunksize, sheet_name)
+    while True:
+        with stage("stream.read_chunk"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+
+        with stage("stream.clean_names", rows=len(chunk)):
+            chunk = clean_product_names(chunk)
+
+        with stage("stream.nutriscore", rows=len(chunk)):
+            ns = NutriScoreEngine.calculate_many(chunk, columns=NutriScoreEngine.DATASET_COLUMNS)
+            chunk['NutriScore_Calc_Score'] = ns['score']
+            chunk['NutriScore_Calc_Lettre'] = ns['grade']
+            chunk['NutriScore_Calc_N'] = ns['n_total']
+            chunk['NutriScore_Calc_P'] = ns['p_total']
+
+        with stage("stream.electre", rows=len(chunk)):
+            chunk = pd.concat([chunk, model._sweep_labels(chunk, lambdas)], axis=1)
+
+        with stage("stream.write_csv", rows=len(chunk)):
+            chunk.to_csv(output_path, index=False,
+                         mode='w' if n_rows == 0 else 'a', header=(n_rows == 0))
+        n_rows += len(chunk)
+
+    return n_rows
+
+
+def product_keys(df, seen=None):
+    """
+    Identité d'un produit : Nom_Produit + Marque (plus un rang d'occurrence
+    si le couple apparaît plusieurs fois).
+    seen : lecture par blocs, dict des occurrences des blocs précédents (mis à jour).
+    """
+    names = df['Nom_Produit'].fillna('').astype(str) + '\x1f' + df['Marque'].fillna('').astype(str)
+    occurrence = names.groupby(names, sort=False).cumcount()
+    if seen is not None:
+        occurrence += names.map(seen).fillna(0).astype(int)
+        for name, count in names.value_counts(sort=False).items():
+            seen[name] = seen.get(name, 0) + count
+    return (names + '\x1f' + occurrence.astype(str)).to_numpy()
+
+
+def content_hashes(df, columns):
+    """
+    Empreinte (uint64) des valeurs de `columns`, ligne par ligne. Les colonnes
+    numériques sont comparées en float (5 == 5.0 après un aller-retour csv).
+    """
+    values = pd.DataFrame({
+        c: df[c].astype(float) if pd.api.types.is_numeric_dtype(df[c]) else df[c].astype(str)
+        for c in columns
+    })
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def _scored_inputs(model):
+    """Colonnes dont dépendent les scores : critères, entrées du Nutri-Score, groupe des profils."""
+    columns = model.criteria + list(NutriScoreEngine.DATASET_COLUMNS.values())
+    if model.group_col is not None:
+        columns.append(model.group_col)
+    return list(dict.fromkeys(columns))
+
+
+def _score_columns(lambdas):
+    columns = ['NutriScore_Calc_Score', 'NutriScore_Calc_Lettre', 'NutriScore_Calc_N', 'NutriScore_Calc_P']
+    for lambd in lambdas:
+        columns += [f"ELECTRE_Pess_{lambd}", f"ELECTRE_Opt_{lambd}"]
+    return columns
+
+
+def _nutriscore_frame(df):
+    """Colonnes NutriScore_Calc_* des lignes de df."""
+    ns = NutriScoreEngine.calculate_many(df, columns=NutriScoreEngine.DATASET_COLUMNS)
+    return pd.DataFrame({
+        'NutriScore_Calc_Score': ns['score'],
+        'NutriScore_Calc_Lettre': ns['grade'],
+        'NutriScore_Calc_N': ns['n_total'],
+        'NutriScore_Calc_P': ns['p_total'],
+    }, index=df.index)
+
+
+def _score_frame(model, df, lambdas):
+    """Colonnes NutriScore_Calc_* et ELECTRE_* des lignes de df."""
+    return pd.concat([_nutriscore_frame(df), model._sweep_labels(df, lambdas)], axis=1)
+
+
+def _incremental_profiles(model, inputs, profiles_path, profile_tolerance, unchanged):
+    """
+    Profils d'un run incrémental. Si les entrées du scoring n'ont pas changé
+    (unchanged), ceux de profiles_path sont relus tels quels, sans recalcul.
+    Sinon ils sont reconstruits sur inputs (DataFrame, ou fonction qui le
+    renvoie) et ceux de profiles_path gardés tant que la dérive reste sous
+    profile_tolerance. Retourne (drift, profiles_rebuilt).
+    """
+    if unchanged and os.path.exists(profiles_path):
+        model.profiles, model.group_profiles, _ = model.read_profiles(profiles_path)
+        return 0.0, False
+
+    model.build_limiting_profiles(inputs() if callable(inputs) else inputs)
+    drift = None
+    if os.path.exists(profiles_path):
+        previous_profiles, previous_groups, _ = model.read_profiles(profiles_path)
+        drift = model.profile_drift(previous_profiles, previous_groups)
+        if drift <= profile_tolerance:
+            model.profiles = previous_profiles
+            model.group_profiles = previous_groups
+    return drift, drift is None or drift > profile_tolerance
+
+
+def score_dataset_incremental(input_path, output_path, model, profiles_path=None,
+                              lambdas=None, sheet_name='Sheet1', profile_tolerance=0.02):
+    """
+    Re-scoring incrémental de input_path vers output_path (même format que
+    score_dataset_streaming : colonnes source + NutriScore_Calc_* + ELECTRE_*).
+    - Les produits sont appariés à la sortie précédente par product_keys ;
+      seuls les produits nouveaux ou dont les entrées du scoring ont changé
+      (content_hashes) sont re-scorés, les autres reprennent leurs résultats.
+    - Les profils utilisés sont sauvegardés dans profiles_path (par défaut
+      <output>_profiles.csv), par groupe compris. Ils sont relus sans recalcul
+      si aucune entrée du scoring n'a changé ; sinon ils ne sont reconstruits
+      que si les profils du dataset courant s'en écartent de plus de
+      profile_tolerance (ElectreTri.profile_drift) ; tout est alors re-scoré.
+    - Une ligne de csv n'a pas de longueur fixe : elle ne peut pas être
+      réécrite à sa position. La sortie précédente est donc relue en entier, et
+      output_path réécrit en entier dès qu'une ligne a changé. Pour ne réécrire
+      que les lignes modifiées, cf. score_store_incremental (ColumnStore).
+    Retourne un dict : rows, new, modified, removed, rescored, drift, profiles_rebuilt.
+    """
+    if lambdas is None:
+        lambdas = model.lambdas
+    if profiles_path is None:
+        profiles_path = os.path.splitext(output_path)[0] + '_profiles.csv'
+
+    with stage("incremental.read_source"):
+        df = read_dataset(input_path, sheet_name)
+    df = clean_product_names(df)
+    keys = product_keys(df)
+    scored_inputs = _scored_inputs(model)
+    hashes = content_hashes(df, scored_inputs)
+    score_cols = _score_columns(lambdas)
+
+    # 1. Appariement avec la sortie précédente
+    previous = None
+    if os.path.exists(output_path):
+        previous = pd.read_csv(output_path, float_precision="round_trip")
+        if not set(score_cols) <= set(previous.columns):
+            previous = None
+
+    if previous is None:
+        positions = np.full(len(df), -1)
+        same_content = np.zeros(len(df), dtype=bool)
+        n_modified = n_removed = 0
+    else:
+        prev_index = pd.Index(product_keys(previous))
+        positions = prev_index.get_indexer(keys)
+        found = positions >= 0
+        prev_hashes = content_hashes(previous, scored_inputs)
+        same_content = found & (prev_hashes[np.where(found, positions, 0)] == hashes)
+        n_modified = int(found.sum() - same_content.sum())
+        n_removed = len(previous) - int(found.sum())
+
+    # 2. Profils : on garde ceux du run précédent tant que la dérive reste faible
+    with stage("incremental.profiles", rows=len(df)):
+        unchanged_inputs = previous is not None and len(previous) == len(df) and same_content.all()
+        drift, profiles_rebuilt = _incremental_profiles(model, df, profiles_path,
+                                                        profile_tolerance, unchanged_inputs)
+    # nouveaux profils : toutes les affectations ELECTRE sont à refaire
+    unchanged = same_content & (not profiles_rebuilt)
+
+    # 3. Scoring des seules lignes nouvelles ou modifiées
+    changed = ~unchanged
+    parts = []
+    if unchanged.any():
+        kept = previous[score_cols].iloc[positions[unchanged]]
+        parts.append(kept.set_axis(df.index[unchanged]))
+    if changed.any():
+        with stage("incremental.score", rows=int(changed.sum())):
+            parts.append(_score_frame(model, df[changed], lambdas))
+
+    scores = pd.concat(parts).loc[df.index, score_cols] if parts else pd.DataFrame(columns=score_cols)
+    out = pd.concat([df.drop(columns=score_cols, errors='ignore'), scores], axis=1)
+
+    # 4. Écriture uniquement si quelque chose a changé (autres colonnes et ordre compris)
+    n_found = int((positions >= 0).sum())
+    rewrite = (previous is None or changed.any() or list(previous.columns) != list(out.columns)
+               or not np.array_equal(positions, np.arange(len(previous))))
+    if not rewrite:
+        source_cols = [c for c in df.columns if c not in score_cols]
+        rewrite = not np.array_equal(content_hashes(previous, source_cols), content_hashes(df, source_cols))
+    if rewrite:
+        with stage("incremental.write_csv", rows=len(out)):
+            out.to_csv(output_path, index=False)
+    if profiles_rebuilt:
+        model.save_profiles(profiles_path)
+
+    return {
+        'rows': len(out),
+        'new': len(df) - n_found,
+        'modified': n_modified,
+        'removed': n_removed,
+        'rescored': int(changed.sum()),
+        'drift': drift,
+        'profiles_rebuilt': profiles_rebuilt,
+    }
+
+
+# colonnes du store propres au re-scoring incrémental : identité du produit,
+# empreinte des entrées du scoring, empreinte de toute la ligne source
+KEY_COL, SCORED_HASH_COL, ROW_HASH_COL = '_Cle_Produit', '_Empreinte_Scoring', '_Empreinte_Ligne'
+
+
+def _incremental_ids(chunk, scored_inputs, source_cols, seen):
+    return pd.DataFrame({
+        KEY_COL: pd.util.hash_array(product_keys(chunk, seen)),
+        SCORED_HASH_COL: content_hashes(chunk, scored_inputs),
+        ROW_HASH_COL: content_hashes(chunk, source_cols),
+    }, index=chunk.index)
+
+
+def _append_to_store(store, chunk, ids, lambdas):
+    """
+    Ajoute un bloc au store, chaque colonne sous son étape : source,
+    empreintes, NutriScore_Calc_* ; les colonnes ELECTRE_* restent vides
+    (dépendent des profils, cf. _write_store_electre).
+    """
+    scores = _nutriscore_frame(chunk)
+    pending = pd.DataFrame({c: pd.Series(None, index=chunk.index, dtype=object)
+                            for c in _score_columns(lambdas) if c.startswith('ELECTRE_')})
+    if store.exists():
+        store.append_rows(pd.concat([chunk, ids, scores, pending], axis=1))
+        return
+    store.append_columns(chunk)
+    store.append_columns(ids, stage="incremental")
+    store.append_columns(scores, stage="nutriscore")
+    store.append_columns(pending, stage="electre")
+
+
+def _store_profile_frame(store, model):
+    """Entrées des profils lues dans le store (memory-map pour les critères)."""
+    columns = model.criteria + ([model.group_col] if model.group_col is not None else [])
+    frame = store.read(columns)
+    if model.group_col is not None and frame[model.group_col].dtype == 'category':
+        # modalités du store dans l'ordre d'ajout : triées comme celles d'un csv
+        group = frame[model.group_col]
+        frame[model.group_col] = group.cat.reorder_categories(sorted(group.cat.categories))
+    return frame
+
+
+def _write_store_electre(store, model, lambdas, chunksize):
+    """Recalcule toutes les colonnes ELECTRE_* du store, bloc par bloc, sur place."""
+    source = _store_profile_frame(store, model)
+    with stage("incremental.score_electre", rows=store.n_rows):
+        for start in range(0, store.n_rows, chunksize):
+            rows = source.iloc[start:start + chunksize]
+            store.write_rows(model._sweep_labels(rows, lambdas), np.arange(start, start + len(rows)))
+
+
+def score_store_incremental(input_path, store, model, profiles_path=None, lambdas=None,
+                            sheet_name='Sheet1', chunksize=100_000, profile_tolerance=0.02):
+    """
+    Re-scoring incrémental de input_path dans un ColumnStore (objet ou dossier) :
+    colonnes source, NutriScore_Calc_* (étape "nutriscore"), ELECTRE_*
+    ("electre") et empreintes des produits ("incremental").
+    - input_path est lu par blocs de chunksize lignes ; seules les lignes
+      nouvelles ou modifiées sont gardées en mémoire. La sortie précédente
+      n'est pas relue : ses empreintes sont lues en memory-map.
+    - Tant que les produits déjà stockés gardent leur position (ajouts en fin
+      de fichier), les lignes modifiées sont réécrites à leur position
+      (ColumnStore.write_rows) et les nouvelles ajoutées en fin de colonnes
+      (ColumnStore.append_rows) : seuls ces produits sont re-scorés.
+    - Si des produits ont été supprimés ou réordonnés, les positions changent :
+      le store est reconstruit bloc par bloc (les colonnes d'autres étapes,
+      RF ou WSM, n'y sont pas reprises).
+    - Profils (profiles_path, par défaut profiles.csv dans le store) : comme
+      score_dataset_incremental, relus sans recalcul si aucune entrée du
+      scoring n'a changé. Sinon ils sont calculés sur les colonnes du store
+      (memory-map), une fois les lignes écrites ; s'ils sont reconstruits,
+      toutes les colonnes ELECTRE_* sont recalculées bloc par bloc, sur place.
+    Retourne le même dict que score_dataset_incremental.
+    """
+    if lambdas is None:
+        lambdas = model.lambdas
+    if not isinstance(store, ColumnStore):
+        store = ColumnStore(store)
+    if profiles_path is None:
+        profiles_path = os.path.join(store.path, 'profiles.csv')
+    scored_inputs = _scored_inputs(model)
+
+    # 1. Lecture par blocs : les produits déjà stockés sont-ils à leur position ?
+    id_cols = [KEY_COL, SCORED_HASH_COL, ROW_HASH_COL]
+    in_place = store.exists() and set(_score_columns(lambdas) + id_cols) <= set(store.columns)
+    if in_place:
+        n_stored = store.n_rows
+        source_cols = store.stage_columns("source")
+        stored_keys = pd.Index(store.column(KEY_COL))
+        in_place = stored_keys.is_unique
+    seen, changed, n_rows, n_modified = {}, [], 0, 0
+    with stage("incremental.scan"):
+        chunks = iter_dataset_chunks(input_path, chunksize, sheet_name) if in_place else ()
+        for chunk in chunks:
+            chunk = clean_product_names(chunk).set_axis(pd.RangeIndex(n_rows, n_rows + len(chunk)))
+            n_rows += len(chunk)
+            if list(chunk.columns) != source_cols:
+                in_place = False
+                break
+            ids = _incremental_ids(chunk, scored_inputs, source_cols, seen)
+            positions = stored_keys.get_indexer(ids[KEY_COL])
+            stored = slice(chunk.index[0], min(n_rows, n_stored))
+            n_old = max(0, stored.stop - stored.start)
+            if not (np.array_equal(positions[:n_old], np.arange(stored.start, stored.start + n_old))
+                    and (positions[n_old:] < 0).all()):
+                in_place = False
+                break
+            rescore = np.ones(len(chunk), dtype=bool)
+            rescore[:n_old] = store.column(SCORED_HASH_COL)[stored] != ids[SCORED_HASH_COL].to_numpy()[:n_old]
+            modified = rescore.copy()
+            modified[:n_old] |= store.column(ROW_HASH_COL)[stored] != ids[ROW_HASH_COL].to_numpy()[:n_old]
+            n_modified += int(rescore[:n_old].sum())
+            if modified.any():
+                changed.append(pd.concat([chunk, ids], axis=1)[modified].assign(_rescore=rescore[modified]))
+    if in_place and n_rows < n_stored:
+        in_place = False   # produits supprimés en fin de fichier
+
+    if not in_place:
+        return _rebuild_store(input_path, store, model, profiles_path, lambdas, sheet_name,
+                              chunksize, profile_tolerance)
+
+    changed = pd.concat(changed) if changed else pd.DataFrame(columns=source_cols + id_cols + ['_rescore'])
+    rescore = changed.pop('_rescore').to_numpy(dtype=bool)
+    is_new = changed.index.to_numpy() >= n_stored
+    old, rescored = changed[~is_new], changed[rescore]
+
+    # 2. Lignes modifiées réécrites à leur position, nouvelles lignes ajoutées
+    #    (NutriScore_Calc_* compris : il ne dépend pas des profils)
+    with stage("incremental.write_rows", rows=len(changed)):
+        if len(old):
+            store.write_rows(old, old.index)
+            old_rescored = rescored[rescored.index < n_stored]
+            if len(old_rescored):
+                store.write_rows(_nutriscore_frame(old_rescored), old_rescored.index)
+        if is_new.any():
+            _append_to_store(store, changed.loc[is_new, source_cols], changed.loc[is_new, id_cols], lambdas)
+
+    # 3. Profils : sur les colonnes du store, à jour
+    with stage("incremental.profiles", rows=n_rows):
+        drift, profiles_rebuilt = _incremental_profiles(model, lambda: _store_profile_frame(store, model),
+                                                        profiles_path, profile_tolerance,
+                                                        unchanged=not rescore.any())
+
+    # 4. Affectations ELECTRE : lignes modifiées ou nouvelles, toutes si nouveaux profils
+    if profiles_rebuilt:
+        _write_store_electre(store, model, lambdas, chunksize)
+        model.save_profiles(profiles_path)
+    elif len(rescored):
+        with stage("incremental.score_electre", rows=len(rescored)):
+            store.write_rows(model._sweep_labels(rescored, lambdas), rescored.index)
+
+    return {
+        'rows': n_rows,
+        'new': n_rows - n_stored,
+        'modified': n_modified,
+        'removed': 0,
+        'rescored': n_rows if profiles_rebuilt else len(rescored),
+        'drift': drift,
+        'profiles_rebuilt': profiles_rebuilt,
+    }
+
+
+def _rebuild_store(input_path, store, model, profiles_path, lambdas, sheet_name,
+                   chunksize, profile_tolerance):
+    """
+    Reconstruction complète du store (cf. score_store_incremental) : les blocs
+    sont écrits au fil de la lecture, puis les profils sont calculés sur les
+    colonnes du store (memory-map) et les colonnes ELECTRE_* remplies bloc par bloc.
+    """
+    scored_inputs = _scored_inputs(model)
+    previous_keys = None
+    if store.exists() and {KEY_COL, SCORED_HASH_COL} <= set(store.columns):
+        # copies : les fichiers du store vont être remplacés
+        keys = pd.Index(np.array(store.column(KEY_COL)))
+        first = ~keys.duplicated()
+        previous_keys, n_previous = keys[first], store.n_rows
+        previous_hashes = np.array(store.column(SCORED_HASH_COL))[first]
+
+    store.meta = {"n_rows": None, "columns": {}}
+    seen, n_rows, n_found, n_modified = {}, 0, 0, 0
+    for chunk in iter_dataset_chunks(input_path, chunksize, sheet_name):
+        chunk = clean_product_names(chunk).set_axis(pd.RangeIndex(n_rows, n_rows + len(chunk)))
+        n_rows += len(chunk)
+        ids = _incremental_ids(chunk, scored_inputs, list(chunk.columns), seen)
+        if previous_keys is not None:
+            positions = previous_keys.get_indexer(ids[KEY_COL])
+            found = positions >= 0
+            n_found += int(found.sum())
+            n_modified += int((previous_hashes[positions[found]] != ids[SCORED_HASH_COL].to_numpy()[found]).sum())
+        with stage("incremental.store_append", rows=len(chunk)):
+            _append_to_store(store, chunk, ids, lambdas)
+
+    with stage("incremental.profiles", rows=n_rows):
+        drift, profiles_rebuilt = _incremental_profiles(model, lambda: _store_profile_frame(store, model),
+                                                        profiles_path, profile_tolerance, unchanged=False)
+    _write_store_electre(store, model, lambdas, chunksize)
+    if profiles_rebuilt:
+        model.save_profiles(profiles_path)
+
+    return {
+        'rows': n_rows,
+        'new': n_rows - n_found,
+        'modified': n_modified,
+        'removed': 0 if previous_keys is None else n_previous - n_found,
+        'rescored': n_rows,
+        'drift': drift,
+        'profiles_rebuilt': profiles_rebuilt,
+    }
+
+
 # %%
 criteria = [
     "Energie_kJ", "Sucres_g", "Graisses_Sat_g", "Sel_g",
@@ -245,24 +1766,43 @@ directions = {
 weights = {c: 1 / len(criteria) for c in criteria}
 category_labels = ["E", "D", "C", "B", "A"]
 
-model = ElectreTri(
-    criteria=criteria,
-    directions=directions,
-    weights=weights,
-    category_labels=category_labels,
-    lambdas=(0.6, 0.7)
-)
 
-df, confusions = model.apply_and_confusion(df, target_col="NutriScore_Lettre")
+# %%
+if __name__ == "__main__":
+    # NUTRICSOR_PROFILE=profil.json (ou .prom) : mesures par étape, cf. instrumentation.py
+    # Store colonnaire (.npy par colonne) : évite de re-parser le xlsx à chaque run
+    store = ColumnStore('NutriScore_Dynamic_Dataset_store')
+    if store.exists():
+        with stage("pipeline.read_store"):
+            df = store.read(store.stage_columns("source"))
+    else:
+        with stage("pipeline.read_excel"):
+            df = pd.read_excel('NutriScore_Dynamic_Dataset.xlsx', sheet_name='Sheet1')
 
-# Affichage graphique des matrices de confusion
-ElectreTri.plot_confusion_matrices(confusions)
+    with stage("pipeline.clean_names", rows=len(df)):
+        df = clean_product_names(df)
 
+    with stage("pipeline.write_csv", rows=len(df)):
+        df.to_csv('NutriScore_Dynamic_Dataset_Cleaned.csv', index=False)
+    if not store.exists():
+        with stage("pipeline.store_append", rows=len(df)):
+            store.append_columns(df)
 
-# %%
-df.head()
+    model = ElectreTri(
+        criteria=criteria,
+        directions=directions,
+        weights=weights,
+        category_labels=category_labels,
+        lambdas=(0.6, 0.7)
+    )
 
-# %%
-df.to_csv('NutriScore_Dynamic_Dataset_ELECTRE.csv', index=False)
+    df, confusions = model.apply_and_confusion(df, target_col="NutriScore_Lettre")
 
+    # Matrices de confusion : rapport html/png, sans affichage
+    ElectreTri.plot_confusion_matrices(confusions, output_dir="presentation/results/report")
 
+    with stage("pipeline.write_csv", rows=len(df)):
+        df.to_csv('NutriScore_Dynamic_Dataset_ELECTRE.csv', index=False)
+    # seules les colonnes ELECTRE sont ajoutées au store
+    with stage("pipeline.store_append", rows=len(df)):
+        store.append_columns(df, columns=list(confusions), stage="electre", overwrite=True)
@@ -0,0 +1,167 @@
+import atexit
+import inspect
+import json
+import os
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+_NULL_CONTEXT = nullcontext()
+
+
+class Instrumentation:
+    """
+    Mesures par étape du pipeline : temps réel, temps CPU, lignes traitées et,
+    en option, mémoire allouée (tracemalloc).
+    Désactivée par défaut : une étape ne coûte alors qu'un test de booléen.
+    Activation par enable() ou via la variable d'environnement NUTRICSOR_PROFILE.
+    Les agrégats par étape (summary) sont tenus au fil de l'eau ; seules les
+    max_records dernières mesures brutes sont gardées (records), la mémoire
+    reste bornée dans un processus de longue durée (service).
+    """
+
+    def __init__(self, max_records=10_000):
+        self.enabled = False
+        self.memory = False
+        self.records = deque(maxlen=max_records)
+        self._stages = {}
+        self._stack = []
+
+    def enable(self, memory=False):
+        """Active les mesures ; memory=True trace aussi les allocations (plus lent)."""
+        self.enabled = True
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.memory = False
+
+    def reset(self):
+        self.records.clear()
+        self._stages = {}
+        self._stack = []
+
+    def stage(self, name, rows=None):
+        """Contexte mesurant une étape (`with instrumentation.stage("csv", rows=n):`)."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._measure(name, rows)
+
+    @contextmanager
+    def _measure(self, name, rows):
+        frame = {"peak": 0}
+        if self.memory:
+            mem_start, peak_so_far = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak_so_far)
+            tracemalloc.reset_peak()
+        self._stack.append(frame)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                "stage": name, "rows": rows,
+                "wall_s": time.perf_counter() - wall,
+                "cpu_s": time.process_time() - cpu,
+            }
+            self._stack.pop()
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                # une sous-étape a pu remettre le pic à zéro : on garde le max vu
+                peak = max(peak, frame["peak"])
+                record["alloc_net_bytes"] = current - mem_start
+                record["alloc_peak_bytes"] = peak - mem_start
+                if self._stack:
+                    self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+            self.records.append(record)
+            self._aggregate(record)
+
+    def _aggregate(self, r):
+        s = self._stages.setdefault(r["stage"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": 0})
+        s["calls"] += 1
+        s["wall_s"] += r["wall_s"]
+        s["cpu_s"] += r["cpu_s"]
+        s["rows"] += r["rows"] or 0
+        if "alloc_peak_bytes" in r:
+            s["alloc_peak_bytes"] = max(s.get("alloc_peak_bytes", 0), r["alloc_peak_bytes"])
+
+    def instrumented(self, name=None, rows_from="df"):
+        """
+        Décorateur : mesure chaque appel. Le nombre de lignes est len() de
+        l'argument `rows_from` s'il est présent.
+        """
+        def decorator(func):
+            stage_name = name or func.__qualname__
+            signature = inspect.signature(func)
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                rows = None
+                if rows_from in signature.parameters:
+                    bound = signature.bind_partial(*args, **kwargs)
+                    data = bound.arguments.get(rows_from)
+                    rows = len(data) if hasattr(data, "__len__") else None
+                with self._measure(stage_name, rows):
+                    return func(*args, **kwargs)
+
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """Agrégat par étape (depuis reset) : nombre d'appels, totaux et pic mémoire maximal."""
+        return {name: dict(s) for name, s in self._stages.items()}
+
+    def export_json(self, path):
+        """Résumé complet et dernières mesures brutes (au plus max_records)."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "records": list(self.records)}, f, indent=1)
+
+    def export_prometheus(self, path, prefix="nutricsor_stage"):
+        """Format texte Prometheus (node_exporter textfile collector)."""
+        metrics = [
+            ("calls_total", "calls", "counter"),
+            ("wall_seconds_total", "wall_s", "counter"),
+            ("cpu_seconds_total", "cpu_s", "counter"),
+            ("rows_total", "rows", "counter"),
+            ("alloc_peak_bytes", "alloc_peak_bytes", "gauge"),
+        ]
+        summary = self.summary()
+        lines = []
+        for metric, key, kind in metrics:
+            samples = [(name, s[key]) for name, s in summary.items() if key in s]
+            if not samples:
+                continue
+            lines.append(f"# TYPE {prefix}_{metric} {kind}")
+            for name, value in samples:
+                lines.append(f'{prefix}_{metric}{{stage="{name}"}} {value}')
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def export(self, path):
+        """Export selon l'extension : .prom (Prometheus) ou json."""
+        if path.endswith(".prom"):
+            self.export_prometheus(path)
+        else:
+            self.export_json(path)
+
+
+INSTRUMENTATION = Instrumentation()
+stage = INSTRUMENTATION.stage
+instrumented = INSTRUMENTATION.instrumented
+
+# NUTRICSOR_PROFILE=<fichier .json ou .prom> active les mesures, exportées à
+# la fin du processus quel que soit le point d'entrée (electre, cli, service) ;
+# NUTRICSOR_PROFILE_MEMORY=1 ajoute le suivi des allocations.
+PROFILE_OUTPUT = os.environ.get("NUTRICSOR_PROFILE")
+if PROFILE_OUTPUT:
+    INSTRUMENTATION.enable(memory=os.environ.get("NUTRICSOR_PROFILE_MEMORY") == "1")
+    atexit.register(INSTRUMENTATION.export, PROFILE_OUTPUT)
@@ -0,0 +1,554 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+# sklearn, scipy, joblib et matplotlib sont importés à l'usage : importer
+# models (ex : pour WeightedSumModel) ne les charge pas.
+from dataset_io import iter_dataset_chunks
+from electre import ConfusionAccumulator, add_column_if_missing, content_hashes
+
+
+class RandomForestNutri:
+    def __init__(self, criteria, target_col="NutriScore_Lettre",
+                 n_estimators=200, random_state=42, max_depth=None, n_jobs=-1):
+        """
+        RandomForest pour prédire le NutriScore à partir des critères nutritionnels.
+        n_jobs : cœurs utilisés pour l'entraînement et la prédiction (-1 = tous).
+        """
+        from sklearn.ensemble import RandomForestClassifier
+
+        self.criteria = criteria
+        self.target_col = target_col
+        self.model = RandomForestClassifier(
+            n_estimators=n_estimators,
+            random_state=random_state,
+            max_depth=max_depth,
+            n_jobs=n_jobs
+        )
+
+    def _features(self, df):
+        # les arbres de sklearn travaillent en float32 : on évite une copie float64
+        return df[self.criteria].to_numpy(dtype=np.float32)
+
+    def fit(self, df):
+        self.model.fit(self._features(df), df[self.target_col].to_numpy())
+        return self
+
+    def predict(self, df, chunksize=100_000):
+        """Prédiction par blocs de chunksize lignes (mémoire bornée sur les grandes tables)."""
+        preds = [
+            self.model.predict(self._features(df.iloc[start:start + chunksize]))
+            for start in range(0, len(df), chunksize)
+        ]
+        return np.concatenate(preds) if preds else np.empty(0, dtype=object)
+
+    def fingerprint(self, train_df):
+        """
+        Empreinte de l'entraînement : critères, cible, hyperparamètres, version
+        de sklearn et contenu des lignes d'entraînement (valeurs et notes).
+        Une forêt sauvegardée n'est réutilisée que si elle est identique.
+        """
+        import sklearn
+
+        params = self.model.get_params()
+        rows = content_hashes(train_df, list(self.criteria) + [self.target_col])
+        return {
+            "criteria": list(self.criteria), "target_col": self.target_col,
+            "n_train": len(train_df), "sklearn": sklearn.__version__,
+            "params": {k: params[k] for k in ("n_estimators", "random_state", "max_depth")},
+            "train_rows": hashlib.sha1(rows.tobytes()).hexdigest(),
+        }
+
+    def save(self, path, fingerprint=None):
+        """Sauvegarde la forêt entraînée (joblib), avec l'empreinte de son entraînement."""
+        import joblib
+
+        joblib.dump({"criteria": list(self.criteria), "target_col": self.target_col,
+                     "fingerprint": fingerprint, "model": self.model}, path)
+
+    @staticmethod
+    def _read_state(path):
+        import joblib
+
+        return joblib.load(path)
+
+    @classmethod
+    def load(cls, path):
+        """Recharge une forêt sauvegardée par save, sans réentraînement."""
+        state = cls._read_state(path)
+        rf = cls(state["criteria"], target_col=state["target_col"])
+        rf.model = state["model"]
+        return rf
+
+    def add_predictions_and_confusion(self, df, n_train=50, model_path=None, chunksize=100_000):
+        """
+        - Sépare le dataset en :
+            * train : n_train lignes (stratifié par NutriScore)
+            * test  : le reste
+        - Entraîne la RF sur le train (ou, si model_path contient une forêt de
+          même empreinte, cf. fingerprint, la recharge au lieu de réentraîner ;
+          sinon la forêt entraînée y est sauvegardée)
+        - Prédit sur le test, par blocs de chunksize lignes
+        - Ajoute une colonne 'RF_Pred' (remplie seulement pour les lignes de test)
+        - Retourne :
+            * df mis à jour
+            * matrice de confusion (test uniquement)
+        """
+        from sklearn.model_selection import train_test_split
+
+        y = df[self.target_col]
+        idx = df.index
+
+        # Si 50 > nb de lignes - 1, on réduit un peu pour éviter les erreurs
+        n_train = min(n_train, len(df) - 1)
+
+        # Seuls les indices sont découpés : pas de copie des critères
+        idx_train, idx_test = train_test_split(
+            idx,
+            train_size=n_train,
+            stratify=y,         # assure une répartition équilibrée des classes
+            random_state=42
+        )
+
+        train_df = df.loc[idx_train]
+        fingerprint = self.fingerprint(train_df) if model_path is not None else None
+        state = None
+        if model_path is not None and os.path.exists(model_path):
+            state = self._read_state(model_path)
+        if state is not None and state.get("fingerprint") == fingerprint:
+            self.model = state["model"]
+        else:
+            # Entraînement (pas de forêt sauvegardée, ou entraînée sur d'autres données)
+            self.fit(train_df)
+            if model_path is not None:
+                self.save(model_path, fingerprint)
+
+        # Prédiction sur le test uniquement
+        y_test = y.loc[idx_test]
+        y_pred = self.predict(df.loc[idx_test], chunksize)
+
+        # Colonne de prédiction (NaN partout sauf sur le test)
+        df = add_column_if_missing(df, "RF_Pred", pd.Series(np.nan, index=df.index, dtype=object))
+        df.loc[idx_test, "RF_Pred"] = y_pred
+
+        # Matrice de confusion sur le test
+        acc = ConfusionAccumulator().update(ConfusionAccumulator.encode(y_test),
+                                            {"RF_Pred": ConfusionAccumulator.encode(y_pred)})
+        return df, acc.frame("RF_Pred", pred_columns=ConfusionAccumulator.GRADES)
+
+    @staticmethod
+    def plot_rf_feature_dendrogram(df, criteria, save_path=None):
+        """
+        Dendrogramme hiérarchique des critères utilisés par la Random Forest.
+        On regroupe les features en fonction de la corrélation absolue entre elles.
+        """
+        import matplotlib.pyplot as plt
+        from scipy.cluster.hierarchy import dendrogram, linkage
+        from scipy.spatial.distance import squareform
+
+        # Corrélation absolue entre critères
+        corr = df[criteria].corr().abs()
+
+        # Distance = 1 - corrélation
+        dist = 1 - corr
+        # La fonction linkage attend un vecteur condensé de distances
+        dist_condensed = squareform(dist.values, checks=False)
+
+        # Clustering hiérarchique (méthode 'average' = UPGMA)
+        Z = linkage(dist_condensed, method='average')
+
+        # Plot
+        plt.figure(figsize=(10, 5))
+        dendrogram(
+            Z,
+            labels=criteria,
+            leaf_rotation=0,
+            leaf_font_size=10,
+        )
+        plt.title("Dendrogramme des critères (Random Forest)")
+        plt.ylabel("Distance (1 - |corrélation|)")
+        plt.tight_layout()
+
+        if save_path is not None:
+            plt.savefig(save_path, bbox_inches='tight')
+            print(f"Dendrogramme sauvegardé dans : {save_path}")
+
+        plt.show()
+
+    @staticmethod
+    def plot_sample_dendrogram_with_nutriscore(df, criteria, target_col="NutriScore_Lettre",
+                                            max_samples=200):
+        """
+        Dendrogramme hiérarchique des PRODUITS, labels = NutriScore (A/B/C/D/E).
+
+        - On clusterise les lignes de df en fonction des critères nutritionnels.
+        - Chaque feuille est un produit, étiqueté par sa lettre de NutriScore.
+        - Les lettres sont colorées par classe.
+        Au-delà de max_samples produits, le linkage (quadratique) ne porte que
+        sur un sous-ensemble représentatif : le produit le plus proche du centre
+        de chacun des max_samples clusters de ProductClusters.
+        """
+        import matplotlib.pyplot as plt
+        import matplotlib.patches as mpatches
+        from scipy.cluster.hierarchy import dendrogram, linkage
+        from sklearn.preprocessing import StandardScaler
+
+        # Option : pour éviter un graphe illisible si trop de produits
+        if len(df) > max_samples:
+            clusters = ProductClusters(criteria, n_clusters=max_samples, target_col=target_col).fit(df)
+            df = df.loc[clusters.summary(df)["representative"].dropna()]
+
+        X = df[criteria].values
+        y = df[target_col].values
+
+        # Standardisation pour que tous les critères soient à la même échelle
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+
+        # Clustering hiérarchique des produits
+        # (Ward sur distance euclidienne)
+        Z = linkage(X_scaled, method="ward")
+
+        # Mapping couleur pour les classes A..E
+        color_map = {
+            "A": "green",
+            "B": "limegreen",
+            "C": "orange",
+            "D": "red",
+            "E": "darkred"
+        }
+
+        plt.figure(figsize=(10, 5))
+        dendrogram(
+            Z,
+            labels=y,              # A/B/C/D/E en labels de feuilles
+            leaf_rotation=90,
+            leaf_font_size=8,
+        )
+
+        ax = plt.gca()
+
+        # Colorer chaque label selon sa classe
+        for tick in ax.get_xmajorticklabels():
+            grade = tick.get_text()
+            tick.set_color(color_map.get(grade, "black"))
+
+        plt.title("Dendrogramme des produits annoté par NutriScore")
+        plt.ylabel("Distance (similarité entre produits)")
+        plt.tight_layout()
+
+        # Légende des couleurs
+        handles = [
+            mpatches.Patch(color=c, label=cl)
+            for cl, c in color_map.items()
+        ]
+        plt.legend(handles=handles, title="NutriScore", loc="upper right")
+
+        plt.show()
+
+
+class ProductClusters:
+    """
+    Clustering des produits sur les critères standardisés en mémoire linéaire :
+    k-means par mini-lots (MiniBatchKMeans) au lieu d'un linkage hiérarchique
+    sur toutes les distances deux à deux (matrice O(n²)).
+    Le résumé par cluster (répartition NutriScore, représentant) se calcule
+    bloc par bloc ; le dendrogramme ne porte que sur les n_clusters centres.
+    """
+    COLOR_MAP = {"A": "green", "B": "limegreen", "C": "orange", "D": "red", "E": "darkred"}
+
+    def __init__(self, criteria, n_clusters=50, target_col="NutriScore_Lettre",
+                 batch_size=4096, random_state=42):
+        self.criteria = criteria
+        self.n_clusters = n_clusters
+        self.target_col = target_col
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self.scaler = None
+        self.kmeans = None
+
+    def _features(self, df):
+        # produits avec tous les critères renseignés
+        X = df[self.criteria].to_numpy(dtype=float)
+        return X, ~np.isnan(X).any(axis=1)
+
+    def _new_models(self, n_clusters):
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.preprocessing import StandardScaler
+
+        self.scaler = StandardScaler()
+        self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=self.batch_size,
+                                      n_init=3, random_state=self.random_state)
+
+    def fit(self, df):
+        """Standardisation + k-means par mini-lots sur une table en mémoire."""
+        X, valid = self._features(df)
+        X = X[valid]
+        self._new_models(min(self.n_clusters, len(X)))
+        self.kmeans.fit(self.scaler.fit_transform(X))
+        return self
+
+    def fit_file(self, path, chunksize=100_000, sheet_name='Sheet1', n_passes=1):
+        """
+        Même apprentissage sur un fichier, bloc par bloc (mémoire : un bloc) :
+        une passe pour la standardisation, puis n_passes passes de
+        partial_fit par lots de batch_size produits.
+        """
+        def blocks():
+            for chunk in iter_dataset_chunks(path, chunksize, sheet_name, usecols=self.criteria):
+                X, valid = self._features(chunk)
+                yield X[valid]
+
+        self._new_models(self.n_clusters)
+        for X in blocks():
+            if len(X):
+                self.scaler.partial_fit(X)
+        for _ in range(n_passes):
+            for X in blocks():
+                X = self.scaler.transform(X)
+                for start in range(0, len(X), self.batch_size):
+                    self.kmeans.partial_fit(X[start:start + self.batch_size])
+        return self
+
+    def predict(self, df, chunksize=100_000):
+        """Cluster de chaque produit (int32, -1 si un critère manque), par blocs."""
+        labels = np.full(len(df), -1, dtype=np.int32)
+        for start in range(0, len(df), chunksize):
+            X, valid = self._features(df.iloc[start:start + chunksize])
+            if valid.any():
+                labels[start:start + chunksize][valid] = self.kmeans.predict(self.scaler.transform(X[valid]))
+        return labels
+
+    def summarize(self, chunks):
+        """
+        Résumé par cluster sur des blocs de produits (itérable de DataFrames,
+        ex : iter_dataset_chunks) :
+            * n, répartition NutriScore A..E, classe majoritaire et sa part (purity)
+            * representative : index du produit le plus proche du centre
+            * centre du cluster dans les unités des critères
+        """
+        k = self.kmeans.n_clusters
+        grades = list(ConfusionAccumulator.GRADES)
+        counts = np.zeros((k, len(grades) + 1), dtype=np.int64)    # dernière colonne : hors A..E
+        best = np.full(k, np.inf)
+        representative = np.full(k, None, dtype=object)
+
+        for chunk in chunks:
+            X, valid = self._features(chunk)
+            if not valid.any():
+                continue
+            Xs = self.scaler.transform(X[valid])
+            labels = self.kmeans.predict(Xs)
+            codes = ConfusionAccumulator.encode(chunk[self.target_col].to_numpy()[valid]).astype(np.int64)
+            codes[codes < 0] = len(grades)
+            counts += np.bincount(labels * (len(grades) + 1) + codes,
+                                  minlength=counts.size).reshape(counts.shape)
+
+            # produit le plus proche de son centre, pour chaque cluster du bloc
+            dist = ((Xs - self.kmeans.cluster_centers_[labels]) ** 2).sum(axis=1)
+            order = np.lexsort((dist, labels))
+            first = order[np.r_[True, labels[order][1:] != labels[order][:-1]]]
+            closer = dist[first] < best[labels[first]]
+            best[labels[first][closer]] = dist[first][closer]
+            representative[labels[first][closer]] = chunk.index[valid][first[closer]]
+
+        summary = pd.DataFrame(counts[:, :len(grades)], columns=grades)
+        summary.insert(0, "n", counts.sum(axis=1))
+        graded = summary[grades].sum(axis=1)
+        summary["grade"] = summary[grades].idxmax(axis=1).where(graded > 0)
+        summary["purity"] = summary[grades].max(axis=1) / graded.where(graded > 0)
+        summary["representative"] = representative
+        centres = pd.DataFrame(self.scaler.inverse_transform(self.kmeans.cluster_centers_),
+                               columns=self.criteria)
+        summary.index.name = "cluster"
+        return pd.concat([summary, centres], axis=1)
+
+    def summary(self, df, chunksize=100_000):
+        """summarize sur une table en mémoire."""
+        return self.summarize(df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize))
+
+    def plot_dendrogram(self, summary, save_path=None):
+        """
+        Dendrogramme (Ward) des centres des clusters non vides : une feuille
+        par cluster, étiquetée par sa classe majoritaire et son effectif,
+        colorée par classe.
+        """
+        import matplotlib.pyplot as plt
+        import matplotlib.patches as mpatches
+        from scipy.cluster.hierarchy import dendrogram, linkage
+
+        used = summary["n"].to_numpy() > 0
+        Z = linkage(self.kmeans.cluster_centers_[used], method="ward")
+        labels = [f"{g if isinstance(g, str) else '?'} ({n})"
+                  for g, n in zip(summary["grade"][used], summary["n"][used])]
+
+        plt.figure(figsize=(12, 5))
+        dendrogram(Z, labels=labels, leaf_rotation=90, leaf_font_size=8)
+
+        ax = plt.gca()
+        for tick in ax.get_xmajorticklabels():
+            tick.set_color(self.COLOR_MAP.get(tick.get_text()[0], "black"))
+
+        plt.title(f"Dendrogramme des {int(used.sum())} clusters de produits ({int(summary['n'].sum())} produits)")
+        plt.ylabel("Distance de Ward entre centres (critères standardisés)")
+        plt.tight_layout()
+        handles = [mpatches.Patch(color=c, label=cl) for cl, c in self.COLOR_MAP.items()]
+        plt.legend(handles=handles, title="Classe majoritaire", loc="upper right")
+
+        if save_path is not None:
+            plt.savefig(save_path, bbox_inches='tight')
+            print(f"Dendrogramme sauvegardé dans : {save_path}")
+
+        plt.show()
+
+
+class WeightedSumModel:
+    def __init__(self, criteria, directions, weights, target_col="NutriScore_Lettre"):
+        """
+        Weighted Sum Model (WSM)
+        - criteria : liste des critères
+        - directions : dict crit -> 1 (plus c'est grand mieux) ou -1 (plus c'est petit mieux)
+        - weights : dict crit -> poids (ils seront normalisés automatiquement)
+        """
+        self.criteria = criteria
+        self.directions = directions
+        self.weights = self._normalize(weights)
+        self.target_col = target_col
+
+    def _normalize(self, w):
+        s = sum(w.values())
+        return {k: v / s for k, v in w.items()}
+
+    def compute_score(self, row):
+        """Score = somme des poids * valeur du critère (normalisé)."""
+        s = 0
+        for c in self.criteria:
+            s += self.weights[c] * row[c]
+        return s
+
+    def criteria_bounds(self, chunks):
+        """
+        Min/max globaux de chaque critère, en une seule passe.
+        chunks : un DataFrame ou un itérable de blocs (ex : iter_dataset_chunks).
+        """
+        if isinstance(chunks, pd.DataFrame):
+            chunks = [chunks]
+        mins = np.full(len(self.criteria), np.inf)
+        maxs = np.full(len(self.criteria), -np.inf)
+        for chunk in chunks:
+            X = chunk[self.criteria].to_numpy(dtype=float)
+            if len(X):
+                mins = np.fmin(mins, np.nanmin(X, axis=0))
+                maxs = np.fmax(maxs, np.nanmax(X, axis=0))
+        return mins, maxs
+
+    def raw_scores(self, df, mins, maxs):
+        """
+        Score non étiré : w · N, N = critères normalisés Min-Max en "coût"
+        (0 = meilleur, 1 = pire). Seul le vecteur des scores est alloué :
+        les colonnes normalisées sont accumulées une à une, dans l'ordre
+        des critères (mêmes sommes flottantes que compute_score).
+        """
+        scores = np.zeros(len(df))
+        for j, c in enumerate(self.criteria):
+            c_min, c_max = mins[j], maxs[j]
+            if c_max == c_min:
+                continue
+            col = df[c].to_numpy(dtype=float)
+            # direction -1 (ex : sucre) : beaucoup => coût élevé ; direction 1 (ex : fibres) : inversé
+            if self.directions[c] == -1:
+                norm = (col - c_min) / (c_max - c_min)
+            else:
+                norm = (c_max - col) / (c_max - c_min)
+            scores += self.weights[c] * norm
+        return scores
+
+    @staticmethod
+    def _stretch(scores, s_min, s_max):
+        # Etirement du score final sur [0, 1] pour atteindre les extrêmes A (0) et E (1)
+        if s_max > s_min:
+            return (scores - s_min) / (s_max - s_min)
+        return scores
+
+    def score_dataset(self, df):
+        """
+        Calcule les scores WSM pour tout le dataset avec normalisation Min-Max.
+        Seule la colonne WSM_Score est ajoutée à df (pas de copie du DataFrame).
+        """
+        mins, maxs = self.criteria_bounds(df)
+        scores = self.raw_scores(df, mins, maxs)
+        df["WSM_Score"] = self._stretch(scores, np.nanmin(scores), np.nanmax(scores)) if len(scores) else scores
+        return df
+
+    def score_dataset_chunked(self, input_path, output_path, chunksize=100_000,
+                              thresholds=None, sheet_name='Sheet1'):
+        """
+        score_dataset + categorize par blocs de chunksize lignes (csv ou xlsx),
+        mémoire bornée quelle que soit la taille du dataset :
+        1) passe sur les critères seuls : min/max globaux de chaque critère
+        2) passe sur les critères seuls : min/max globaux du score brut
+        3) passe complète : WSM_Score et WSM_Pred ajoutés à chaque bloc,
+           écrit à la suite dans output_path (csv).
+        Retourne le nombre de lignes écrites.
+        """
+        mins, maxs = self.criteria_bounds(
+            iter_dataset_chunks(input_path, chunksize, sheet_name, usecols=self.criteria)
+        )
+
+        s_min, s_max = np.inf, -np.inf
+        for chunk in iter_dataset_chunks(input_path, chunksize, sheet_name, usecols=self.criteria):
+            scores = self.raw_scores(chunk, mins, maxs)
+            if len(scores):
+                s_min, s_max = np.fmin(s_min, np.nanmin(scores)), np.fmax(s_max, np.nanmax(scores))
+
+        n_rows = 0
+        for chunk in iter_dataset_chunks(input_path, chunksize, sheet_name):
+            chunk["WSM_Score"] = self._stretch(self.raw_scores(chunk, mins, maxs), s_min, s_max)
+            chunk = self.categorize(chunk, thresholds)
+            chunk.to_csv(output_path, index=False,
+                         mode='w' if n_rows == 0 else 'a', header=(n_rows == 0))
+            n_rows += len(chunk)
+        return n_rows
+
+    def categorize(self, df, thresholds=None):
+        """
+        Convertit le score WSM en NutriScore A/B/C/D/E selon des seuils.
+        
+        - thresholds = dict indiquant les coupures
+            Ex: {"A": 0.2, "B": 0.4, "C": 0.6, "D": 0.8}
+        """
+        if thresholds is None:
+            # seuils génériques pour un score entre 0 et 1
+            thresholds = {"A": 0.2, "B": 0.4, "C": 0.6, "D": 0.8}
+
+        # s <= seuil A -> A, ..., s > seuil D (ou NaN) -> E
+        cuts = [thresholds[l] for l in ("A", "B", "C", "D")]
+        labels = np.array(["A", "B", "C", "D", "E"], dtype=object)
+        df["WSM_Pred"] = labels[np.searchsorted(cuts, df["WSM_Score"].to_numpy(dtype=float), side="left")]
+        return df
+
+    def confusion(self, df):
+        """Retourne la matrice de confusion WSM vs NutriScore réel."""
+        acc = ConfusionAccumulator().update(ConfusionAccumulator.encode(df[self.target_col]),
+                                            {"WSM_Pred": ConfusionAccumulator.encode(df["WSM_Pred"])})
+        return acc.frame("WSM_Pred", pred_columns=ConfusionAccumulator.GRADES)
+
+    def export_configuration(self, filepath=None):
+        """
+        Exporte la configuration du modèle (Critères, Directions, Poids).
+        Retourne un DataFrame. Si filepath est fourni, sauvegarde en CSV.
+        """
+        rows = []
+        for c in self.criteria:
+            rows.append({
+                "Criterion": c,
+                "Direction": self.directions.get(c),
+                "Weight": self.weights.get(c)
+            })
+        df_config = pd.DataFrame(rows)
+        if filepath:
+            df_config.to_csv(filepath, index=False)
+            print(f"Configuration exportée dans {filepath}")
+        return df_config
@@ -0,0 +1,320 @@
+import bisect
+import functools
+import json
+import math
+import operator
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Nutri-Score rules as data. Each component is either
+#   'above': thresholds, one point per threshold strictly exceeded
+#            (or 'points': points per bin when they are not 0, 1, 2, ...), or
+#   'linear': 0 if x <= start, max_points if x > stop, else trunc((x - offset) / step).
+# Another revision (beverages, fats...) is a dict or json file with the same keys,
+# loaded with NutriScoreEngine.use_table.
+GENERAL_FOODS = {
+    'name': 'general-foods',
+    'negative': {
+        'energy': {'linear': {'start': 335, 'stop': 3350, 'offset': 1, 'step': 335, 'max_points': 10}},
+        'sat_fat': {'linear': {'start': 1, 'stop': 10, 'offset': 0, 'step': 1, 'max_points': 10}},
+        'sugar': {'above': [3.4, 6.8, 10, 14, 17, 20, 24, 27, 31, 34, 37, 41, 44, 48, 51]},
+        'salt': {'linear': {'start': 0.2, 'stop': 4.0, 'offset': 0, 'step': 0.2, 'max_points': 20}},
+    },
+    'positive': {
+        'fiber': {'above': [3.0, 4.1, 5.2, 6.3, 7.4]},
+        'protein': {'above': [2.4, 4.8, 7.2, 9.6, 12, 14, 17]},
+        'fruit': {'above': [40, 60, 80], 'points': [0, 1, 2, 5]},
+    },
+    # Proteins are not counted when N >= n_at_least and fruit <= fruit_at_most
+    'protein_rule': {'n_at_least': 11, 'fruit_at_most': 80},
+    # labels[i] when score <= cutoffs[i], last label above the last cutoff
+    'grades': {'labels': ['A', 'B', 'C', 'D', 'E'], 'cutoffs': [0, 2, 10, 18]},
+}
+
+
+class ScoringTable:
+    """
+    A Nutri-Score revision compiled from its spec (see GENERAL_FOODS).
+    Every component becomes sorted float boundaries and the points of each bin:
+    points = points[number of boundaries <= value], a bisect per value
+    (searchsorted for arrays). Linear rules are turned into boundaries once,
+    so they give exactly the points of their formula.
+    """
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec.get('name', 'custom')
+        self.negative = {k: self._compile(rule) for k, rule in spec['negative'].items()}
+        self.positive = {k: self._compile(rule) for k, rule in spec['positive'].items()}
+        self.components = {**self.negative, **self.positive}
+        self.keys = tuple(self.components)
+        self.read_values = operator.itemgetter(*self.keys)
+        self.negative_rules = list(self.negative.values())
+        self.positive_rules = list(self.positive.values())
+        self.protein_index = self.keys.index('protein') - len(self.negative)
+        self.fruit_index = self.keys.index('fruit')
+        self.arrays = {k: (np.array(b, dtype=float), np.array(p, dtype=np.int64))
+                       for k, (b, p) in self.components.items()}
+
+        rule = spec['protein_rule']
+        self.protein_n_at_least = rule['n_at_least']
+        self.protein_fruit_at_most = rule['fruit_at_most']
+        self.protein_messages = (f"Proteins excluded (N >= {self.protein_n_at_least})", "Proteins included")
+        self.grades = tuple(spec['grades']['labels'])
+        self.grade_cutoffs = list(spec['grades']['cutoffs'])
+        if len(self.grades) != len(self.grade_cutoffs) + 1:
+            raise ValueError("A scoring table needs one more grade label than cutoffs.")
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.spec, f, indent=1)
+
+    @staticmethod
+    def _compile(rule):
+        # -> (boundaries, points), boundaries meaning "value >= boundary"
+        if 'linear' in rule:
+            r = {k: float(v) for k, v in rule['linear'].items()}
+            max_points = int(r['max_points'])
+            if r['step'] <= 0 or r['stop'] < r['start']:
+                raise ValueError("A 'linear' rule needs step > 0 and start <= stop.")
+
+            def points(x):
+                if x > r['stop']:
+                    return max_points
+                if x <= r['start']:
+                    return 0
+                return min(math.trunc((x - r['offset']) / r['step']), max_points)
+
+            # offset + k * step is not always the boundary of the formula: the
+            # division and the subtraction round (0.6 / 0.2 == 2.9999999999999996,
+            # so 0.6 g of salt scores 2 points, not 3), and plain thresholds would
+            # change the points of such values. The boundary is found by bisection
+            # on floats instead: points(lo) < k <= points(hi) until lo and hi are
+            # adjacent floats, hi is then the smallest value scoring k points.
+            boundaries = []
+            for k in range(1, max_points + 1):
+                lo, hi = r['start'], math.nextafter(r['stop'], math.inf)
+                while True:
+                    mid = lo + (hi - lo) / 2
+                    if not lo < mid < hi:
+                        break
+                    if points(mid) >= k:
+                        hi = mid
+                    else:
+                        lo = mid
+                boundaries.append(hi)
+            return boundaries, list(range(max_points + 1))
+
+        thresholds = sorted(float(t) for t in rule['above'])
+        # "strictly above t" is "at least the next float after t"
+        boundaries = [math.nextafter(t, math.inf) for t in thresholds]
+        points = [int(p) for p in rule.get('points', range(len(thresholds) + 1))]
+        if len(points) != len(thresholds) + 1:
+            raise ValueError("'points' needs one more entry than 'above'.")
+        return boundaries, points
+
+    def points(self, key, value):
+        boundaries, points = self.components[key]
+        return points[bisect.bisect_right(boundaries, value)]
+
+    def points_many(self, key, values):
+        boundaries, points = self.arrays[key]
+        return points[np.searchsorted(boundaries, values, side='right')]
+
+    def grade(self, score):
+        return self.grades[bisect.bisect_left(self.grade_cutoffs, score)]
+
+    def grade_many(self, scores):
+        return np.array(self.grades)[np.searchsorted(self.grade_cutoffs, scores, side='left')]
+
+
+class NutriScoreEngine:
+    """
+    Calculates the Nutri-Score from the rules of the active ScoringTable.
+    Scalar results are memoized in a bounded LRU cache (see cache_info).
+    """
+    COLORS = {
+        'A': '#038141', 'B': '#85BB2F', 'C': '#FECB02', 'D': '#EE8100', 'E': '#E63E11'
+    }
+
+    table = ScoringTable(GENERAL_FOODS)
+    GRADES = np.array(table.grades)
+    CACHE_SIZE = 65536
+
+    # Column names of the NutriScore_Dynamic_Dataset files
+    DATASET_COLUMNS = {
+        'energy': 'Energie_kJ', 'sat_fat': 'Graisses_Sat_g', 'sugar': 'Sucres_g',
+        'salt': 'Sel_g', 'fiber': 'Fibres_g', 'protein': 'Proteines_g',
+        'fruit': 'Fruits_Legumes_Pct'
+    }
+
+    @classmethod
+    def use_table(cls, table):
+        """
+        Switches the scoring rules: a ScoringTable, a spec dict or the path of
+        a json spec. Clears the cache.
+        """
+        if not isinstance(table, ScoringTable):
+            table = ScoringTable(table) if isinstance(table, dict) else ScoringTable.load(table)
+        cls.table = table
+        cls.GRADES = np.array(table.grades)
+        cls.cache_clear()
+        return table
+
+    @classmethod
+    def configure_cache(cls, maxsize=None):
+        """(Re)creates the LRU cache of calculate; maxsize=0 disables it."""
+        if maxsize is not None:
+            cls.CACHE_SIZE = maxsize
+        cls._cached_calculate = functools.lru_cache(maxsize=cls.CACHE_SIZE)(cls._calculate_key)
+
+    @classmethod
+    def cache_info(cls):
+        """hits, misses, maxsize, currsize of the calculate cache."""
+        return cls._cached_calculate.cache_info()
+
+    @classmethod
+    def cache_clear(cls):
+        cls._cached_calculate.cache_clear()
+
+    @classmethod
+    def get_points_n(cls, energy, sat_fat, sugar, salt):
+        # Negative Points (N), from the active table
+        values = {'energy': energy, 'sat_fat': sat_fat, 'sugar': sugar, 'salt': salt}
+        return sum(cls.table.points(k, values[k]) for k in cls.table.negative)
+
+    @classmethod
+    def get_points_p(cls, fiber, protein, fruit):
+        # Positive points per component: (fiber, protein, fruit)
+        values = {'fiber': fiber, 'protein': protein, 'fruit': fruit}
+        return tuple(cls.table.points(k, values[k]) for k in cls.table.positive)
+
+    @classmethod
+    def calculate(cls, vals):
+        key = tuple(map(float, cls.table.read_values(vals)))
+        # copy: callers may modify the result, the cached one must not change
+        return dict(cls._cached_calculate(key))
+
+    @classmethod
+    def _calculate_key(cls, key):
+        # key: input values in table.keys order
+        table = cls.table
+        if any(map(math.isnan, key)):
+            raise ValueError(f"Missing value for {table.keys[[v != v for v in key].index(True)]}.")
+        score_n = 0
+        for (boundaries, points), v in zip(table.negative_rules, key):
+            score_n += points[bisect.bisect_right(boundaries, v)]
+        points_p = [points[bisect.bisect_right(boundaries, v)]
+                    for (boundaries, points), v in zip(table.positive_rules, key[len(table.negative_rules):])]
+
+        # If N >= 11 AND Fruit <= 80%, Protein is not counted
+        if score_n >= table.protein_n_at_least and key[table.fruit_index] <= table.protein_fruit_at_most:
+            points_p[table.protein_index] = 0
+            protein_msg = table.protein_messages[0]
+        else:
+            protein_msg = table.protein_messages[1]
+        score_p = sum(points_p)
+
+        final_score = score_n - score_p
+        grade = table.grade(final_score)
+
+        return {
+            'score': final_score, 'grade': grade, 'color': cls.COLORS.get(grade),
+            'n_total': score_n, 'p_total': score_p, 'msg': protein_msg
+        }
+
+    @classmethod
+    def get_points_n_many(cls, energy, sat_fat, sugar, salt):
+        # Vectorized counterpart of get_points_n (int64 array)
+        arrays = {'energy': energy, 'sat_fat': sat_fat, 'sugar': sugar, 'salt': salt}
+        return sum(cls.table.points_many(k, arrays[k]) for k in cls.table.negative)
+
+    @classmethod
+    def get_points_p_many(cls, fiber, protein, fruit):
+        # Vectorized counterpart of get_points_p
+        arrays = {'fiber': fiber, 'protein': protein, 'fruit': fruit}
+        return tuple(cls.table.points_many(k, arrays[k]) for k in cls.table.positive)
+
+    @staticmethod
+    def _input_arrays(vals, columns=None, keys=None):
+        # float64 input columns, keyed like calculate
+        columns = columns or {}
+        arrays = {}
+        for key in keys or NutriScoreEngine.table.keys:
+            arr = np.asarray(vals[columns.get(key, key)], dtype=float)
+            if np.isnan(arr).any():
+                raise ValueError(f"Missing value(s) for {key}.")
+            arrays[key] = arr
+        return arrays
+
+    @classmethod
+    def calculate_many(cls, vals, columns=None, table=None):
+        """
+        Batch version of calculate.
+        vals: DataFrame or dict of arrays with the same keys as calculate
+        columns: optional mapping key -> column name (e.g. DATASET_COLUMNS)
+        table: ScoringTable to use instead of the active one
+        Returns a dict of arrays: score, grade, n_total, p_total, protein_excluded.
+        """
+        table = table or cls.table
+        arrays = cls._input_arrays(vals, columns, table.keys)
+
+        score_n = sum(table.points_many(k, arrays[k]) for k in table.negative)
+        points_p = {k: table.points_many(k, arrays[k]) for k in table.positive}
+
+        # If N >= 11 AND Fruit <= 80%, Protein is not counted
+        protein_excluded = ((score_n >= table.protein_n_at_least)
+                            & (arrays['fruit'] <= table.protein_fruit_at_most))
+        points_p['protein'] = np.where(protein_excluded, 0, points_p['protein'])
+        score_p = sum(points_p.values())
+
+        final_score = score_n - score_p
+        grade = table.grade_many(final_score)
+
+        return {
+            'score': final_score, 'grade': grade,
+            'n_total': score_n, 'p_total': score_p, 'protein_excluded': protein_excluded
+        }
+
+    @classmethod
+    def calculate_many_parallel(cls, vals, columns=None, n_jobs=None, n_partitions=None):
+        """
+        calculate_many split into row partitions scored in a process pool.
+        Partitions are merged back in input order.
+        """
+        n_jobs = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+        n_partitions = n_partitions or 4 * n_jobs
+
+        arrays = cls._input_arrays(vals, columns)
+        n_rows = len(arrays[cls.table.keys[0]])
+        bounds = np.linspace(0, n_rows, n_partitions + 1).astype(int)
+        tasks = [{k: v[a:b] for k, v in arrays.items()} for a, b in zip(bounds[:-1], bounds[1:])]
+
+        # the active table is sent once per worker (workers do not see use_table calls)
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_nutriscore_worker,
+                                 initargs=(cls.table,)) as executor:
+            results = list(executor.map(_score_nutriscore_partition, tasks))
+
+        return {k: np.concatenate([r[k] for r in results]) for k in results[0]}
+
+
+_WORKER_TABLE = None
+
+
+def _init_nutriscore_worker(table):
+    """Worker setup: the scoring table is received once, not with every partition."""
+    global _WORKER_TABLE
+    _WORKER_TABLE = table
+
+
+def _score_nutriscore_partition(arrays):
+    return NutriScoreEngine.calculate_many(arrays, table=_WORKER_TABLE)
+
+
+NutriScoreEngine.configure_cache()
@@ -1,115 +1,114 @@
+import os
+import queue
+import threading
+import time
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 
-class NutriScoreEngine:
-    """
-    Calculates the Nutri-Score .
-    """
-    COLORS = {
-        'A': '#038141', 'B': '#85BB2F', 'C': '#FECB02', 'D': '#EE8100', 'E': '#E63E11'
-    }
+import numpy as np
 
-    @staticmethod
-    def get_points_n(energy, sat_fat, sugar, salt):
-        # Calculates Negative Points (N)
-        
-        # Energy (kJ)
-        if energy > 3350: p_en = 10
-        elif energy <= 335: p_en = 0
-        else: p_en = int((energy - 1) // 335)
-
-        # Saturated Fat (g)
-        if sat_fat > 10: p_fa = 10
-        elif sat_fat <= 1: p_fa = 0
-        else: p_fa = int(sat_fat)
-
-        # Sugars (g)
-        if sugar > 51: p_su = 15
-        elif sugar > 48: p_su = 14
-        elif sugar > 44: p_su = 13
-        elif sugar > 41: p_su = 12
-        elif sugar > 37: p_su = 11
-        elif sugar > 34: p_su = 10
-        elif sugar > 31: p_su = 9
-        elif sugar > 27: p_su = 8
-        elif sugar > 24: p_su = 7
-        elif sugar > 20: p_su = 6
-        elif sugar > 17: p_su = 5
-        elif sugar > 14: p_su = 4
-        elif sugar > 10: p_su = 3
-        elif sugar > 6.8: p_su = 2
-        elif sugar > 3.4: p_su = 1
-        else: p_su = 0
-
-        # Salt (g)
-        if salt > 4.0: p_sa = 20
-        elif salt > 0.2: p_sa = int(salt / 0.2)
-        else: p_sa = 0
-        
-        return p_en + p_fa + p_su + p_sa
+from dataset_io import iter_dataset_chunks
 
-    @staticmethod
-    def get_points_p(fiber, protein, fruit):
-        # Calculates Positive Points (P)
-
-        # Fiber (g)
-        if fiber > 7.4: p_fi = 5
-        elif fiber > 6.3: p_fi = 4
-        elif fiber > 5.2: p_fi = 3
-        elif fiber > 4.1: p_fi = 2
-        elif fiber > 3.0: p_fi = 1
-        else: p_fi = 0
-
-        # Protein (g)
-        if protein > 17: p_pr = 7
-        elif protein > 14: p_pr = 6
-        elif protein > 12: p_pr = 5
-        elif protein > 9.6: p_pr = 4
-        elif protein > 7.2: p_pr = 3
-        elif protein > 4.8: p_pr = 2
-        elif protein > 2.4: p_pr = 1
-        else: p_pr = 0
-
-        # Fruit/Veg (%)
-        if fruit > 80: p_fr = 5
-        elif fruit > 60: p_fr = 2
-        elif fruit > 40: p_fr = 1
-        else: p_fr = 0
-
-        return p_fi, p_pr, p_fr
+# the scoring engine has no Tk dependency: the CLI, the service and the
+# worker processes import it from nutriscore_engine directly
+from nutriscore_engine import GENERAL_FOODS, NutriScoreEngine, ScoringTable  # noqa: F401
 
-    @staticmethod
-    def calculate(vals):
-        score_n = NutriScoreEngine.get_points_n(
-            vals['energy'], vals['sat_fat'], vals['sugar'], vals['salt']
-        )
-        p_fi, p_pr, p_fr = NutriScoreEngine.get_points_p(
-            vals['fiber'], vals['protein'], vals['fruit']
-        )
-        
-        score_p_raw = p_fi + p_pr + p_fr
 
-        # If N >= 11 AND Fruit <= 80%, Protein is not counted 
-        if score_n >= 11 and vals['fruit'] <= 80:
-            score_p = p_fi + p_fr
-            protein_msg = "Proteins excluded (N >= 11)"
-        else:
-            score_p = score_p_raw
-            protein_msg = "Proteins included"
-
-        final_score = score_n - score_p
+class BulkScorer:
+    """
+    Scores a CSV/xlsx file of products chunk by chunk on a background thread.
+    Messages are posted to `self.queue` and consumed by the Tk main loop
+    (widgets must only be touched from the main thread):
+    ('total', n_rows or None), ('chunk', DataFrame), ('done', seconds),
+    ('cancelled', None), ('error', message).
+    """
+    LIMITED_KEYS = ('sugar', 'sat_fat', 'salt', 'fiber', 'protein', 'fruit')
+    RESULT_COLUMNS = ['grade', 'score', 'n_total', 'p_total', 'status']
+
+    def __init__(self, path, chunksize=20_000, sheet_name='Sheet1'):
+        self.path = path
+        self.chunksize = chunksize
+        self.sheet_name = sheet_name
+        self.queue = queue.Queue()
+        self._cancel = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def count_rows(self):
+        """Number of data rows (for the progress bar), None if unknown."""
+        if str(self.path).lower().endswith(('.xlsx', '.xlsm')):
+            from openpyxl import load_workbook
+
+            wb = load_workbook(self.path, read_only=True)
+            try:
+                max_row = wb[self.sheet_name].max_row
+            finally:
+                wb.close()
+            return max_row - 1 if max_row else None
+        with open(self.path, 'rb') as f:
+            return sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b'')) - 1
 
-        # Classification
-        if final_score <= 0: grade = 'A'
-        elif final_score <= 2: grade = 'B'
-        elif final_score <= 10: grade = 'C'
-        elif final_score <= 18: grade = 'D'
-        else: grade = 'E'
+    @staticmethod
+    def score_chunk(chunk):
+        """
+        Adds grade/score/n_total/p_total/status to a chunk of products.
+        Columns may use the engine keys (energy, sugar, ...) or the dataset
+        names (DATASET_COLUMNS). Rows failing the form's checks are not scored;
+        `status` says why.
+        """
+        import pandas as pd
+
+        columns = {}
+        for key, dataset_col in NutriScoreEngine.DATASET_COLUMNS.items():
+            if key in chunk.columns:
+                columns[key] = key
+            elif dataset_col in chunk.columns:
+                columns[key] = dataset_col
+            else:
+                raise ValueError(f"Missing column for {key} (expected '{key}' or '{dataset_col}').")
+
+        arrays = {k: pd.to_numeric(chunk[c], errors='coerce').to_numpy(dtype=float) for k, c in columns.items()}
+        status = np.full(len(chunk), 'ok', dtype=object)
+        # same rules as validate_and_calculate, last failing check wins
+        for k, values in arrays.items():
+            status[values < 0] = f"negative {k}"
+            if k in BulkScorer.LIMITED_KEYS:
+                status[values > 100] = f"{k} above 100"
+            status[np.isnan(values)] = f"invalid {k}"
+        valid = status == 'ok'
+
+        out = chunk.copy()
+        out['grade'] = None
+        out[['score', 'n_total', 'p_total']] = np.nan
+        if valid.any():
+            res = NutriScoreEngine.calculate_many({k: v[valid] for k, v in arrays.items()})
+            out.loc[valid, 'grade'] = res['grade']
+            out.loc[valid, 'score'] = res['score']
+            out.loc[valid, 'n_total'] = res['n_total']
+            out.loc[valid, 'p_total'] = res['p_total']
+        out['status'] = status
+        return out
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self.queue.put(('total', self.count_rows()))
+            for chunk in iter_dataset_chunks(self.path, self.chunksize, self.sheet_name):
+                if self._cancel.is_set():
+                    self.queue.put(('cancelled', None))
+                    return
+                self.queue.put(('chunk', self.score_chunk(chunk)))
+            self.queue.put(('done', time.perf_counter() - start))
+        except Exception as exc:
+            self.queue.put(('error', str(exc)))
 
-        return {
-            'score': final_score, 'grade': grade, 'color': NutriScoreEngine.COLORS[grade],
-            'n_total': score_n, 'p_total': score_p, 'msg': protein_msg
-        }
 
 class RoundedFrame(tk.Canvas):
     """
@@ -130,6 +129,160 @@ class RoundedFrame(tk.Canvas):
         points = [x1+r, y1, x1+r, y1, x2-r, y1, x2-r, y1, x2, y1, x2, y1+r, x2, y1+r, x2, y2-r, x2, y2-r, x2, y2, x2-r, y2, x2-r, y2, x1+r, y2, x1+r, y2, x1, y2, x1, y2-r, x1, y2-r, x1, y1+r, x1, y1+r, x1, y1]
         return self.create_polygon(points, smooth=True, **kwargs)
 
+class BulkScoringWindow(tk.Toplevel):
+    """
+    Bulk mode: scores a whole file with BulkScorer and streams progress,
+    grade counts and a results table into the window. The Tk main loop only
+    polls the scorer's queue, so the UI stays responsive.
+    """
+    POLL_MS = 50
+    DISPLAY_LIMIT = 2000     # rows shown in the table; export writes them all
+    ROWS_PER_POLL = 250      # table rows inserted per poll, keeps each poll short
+    NAME_COLUMNS = ('Nom_Produit', 'name', 'product', 'Product')
+
+    def __init__(self, parent, path):
+        super().__init__(parent)
+        self.title(f"Bulk scoring - {os.path.basename(path)}")
+        self.geometry("900x600")
+        self.configure(bg=parent.default_bg)
+
+        self.results = []
+        self.counts = dict.fromkeys(NutriScoreEngine.GRADES, 0)
+        self.n_done = self.n_invalid = 0
+        self.total = None
+        self.pending_rows = []
+        self.name_col = None
+        self.finished = False
+
+        self.create_widgets(path)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.scorer = BulkScorer(path).start()
+        self.after(self.POLL_MS, self.poll)
+
+    def create_widgets(self, path):
+        bg = self.master.default_bg
+        tk.Label(self, text=path, bg=bg, fg="#2C3E50", font=("Helvetica", 10, "bold")).pack(anchor="w", padx=15, pady=(15, 5))
+
+        self.progress = ttk.Progressbar(self, mode="indeterminate")
+        self.progress.pack(fill="x", padx=15)
+        self.progress.start(10)
+
+        self.lbl_status = tk.Label(self, text="Reading file...", bg=bg, anchor="w")
+        self.lbl_status.pack(fill="x", padx=15, pady=5)
+        self.lbl_counts = tk.Label(self, text="", bg=bg, anchor="w", font=("Helvetica", 10, "bold"))
+        self.lbl_counts.pack(fill="x", padx=15)
+
+        table = tk.Frame(self, bg=bg)
+        table.pack(fill="both", expand=True, padx=15, pady=10)
+        self.tree = ttk.Treeview(table, show="headings")
+        scroll = ttk.Scrollbar(table, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        scroll.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        for grade, color in NutriScoreEngine.COLORS.items():
+            self.tree.tag_configure(grade, foreground=color)
+
+        buttons = tk.Frame(self, bg=bg)
+        buttons.pack(fill="x", padx=15, pady=(0, 15))
+        self.btn_cancel = ttk.Button(buttons, text="Cancel", command=self.cancel)
+        self.btn_cancel.pack(side="right")
+        self.btn_export = ttk.Button(buttons, text="Export CSV...", command=self.export, state="disabled")
+        self.btn_export.pack(side="right", padx=10)
+
+    def setup_columns(self, chunk):
+        self.name_col = next((c for c in self.NAME_COLUMNS if c in chunk.columns), None)
+        columns = ([self.name_col] if self.name_col else []) + BulkScorer.RESULT_COLUMNS
+        self.tree.configure(columns=columns)
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=260 if col == self.name_col else 90, anchor="w" if col == self.name_col else "center")
+
+    def poll(self):
+        try:
+            while True:
+                kind, payload = self.scorer.queue.get_nowait()
+                if kind == 'total':
+                    self.total = payload
+                    if payload:
+                        self.progress.stop()
+                        self.progress.configure(mode="determinate", maximum=payload, value=0)
+                elif kind == 'chunk':
+                    self.add_chunk(payload)
+                elif kind == 'done':
+                    self.finish(f"Scored {self.n_done:,} rows in {payload:.2f} s")
+                elif kind == 'cancelled':
+                    self.finish(f"Cancelled after {self.n_done:,} rows")
+                elif kind == 'error':
+                    self.finish(f"Error: {payload}")
+                    messagebox.showerror("Bulk scoring", payload, parent=self)
+        except queue.Empty:
+            pass
+
+        self.insert_pending_rows()
+        if not self.finished or self.pending_rows:
+            self.after(self.POLL_MS, self.poll)
+
+    def add_chunk(self, chunk):
+        if not self.results:
+            self.setup_columns(chunk)
+        self.results.append(chunk)
+        self.n_done += len(chunk)
+
+        grades = chunk['grade'].dropna().value_counts()
+        for grade, n in grades.items():
+            self.counts[grade] += int(n)
+        self.n_invalid += int((chunk['status'] != 'ok').sum())
+
+        room = self.DISPLAY_LIMIT - len(self.tree.get_children()) - len(self.pending_rows)
+        if room > 0:
+            columns = ([self.name_col] if self.name_col else []) + BulkScorer.RESULT_COLUMNS
+            self.pending_rows.extend(chunk[columns].head(room).itertuples(index=False, name=None))
+
+        if self.total:
+            self.progress.configure(value=min(self.n_done, self.total))
+        total = f" / {self.total:,}" if self.total else ""
+        self.lbl_status.config(text=f"{self.n_done:,}{total} rows scored...")
+        counts = "   ".join(f"{g}: {n:,}" for g, n in self.counts.items())
+        self.lbl_counts.config(text=f"{counts}   invalid: {self.n_invalid:,}")
+
+    def insert_pending_rows(self):
+        batch, self.pending_rows = self.pending_rows[:self.ROWS_PER_POLL], self.pending_rows[self.ROWS_PER_POLL:]
+        for row in batch:
+            values = ["" if isinstance(v, float) and np.isnan(v) else v for v in row]
+            grade = row[-5]
+            self.tree.insert("", "end", values=values, tags=(grade,) if grade else ())
+
+    def finish(self, message):
+        self.finished = True
+        self.progress.stop()
+        if self.total:
+            self.progress.configure(mode="determinate", value=self.total)
+        shown = min(self.n_done, self.DISPLAY_LIMIT)
+        suffix = f" (table shows the first {shown:,})" if self.n_done > shown else ""
+        self.lbl_status.config(text=message + suffix)
+        self.btn_cancel.config(text="Close", command=self.close)
+        if self.results:
+            self.btn_export.config(state="normal")
+
+    def cancel(self):
+        self.scorer.cancel()
+
+    def close(self):
+        self.scorer.cancel()
+        self.destroy()
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv")])
+        if not path:
+            return
+        import pandas as pd
+
+        pd.concat(self.results, ignore_index=True).to_csv(path, index=False)
+        self.lbl_status.config(text=f"Exported {self.n_done:,} rows to {path}")
+
+
 class ProNutriApp(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -194,7 +347,11 @@ class ProNutriApp(tk.Tk):
 
         # Action Button
         btn = ttk.Button(self.left_col, text="CALCULATE SCORE", style="Calc.TButton", command=self.validate_and_calculate, cursor="hand2")
-        btn.pack(fill="x", pady=20, ipady=10)
+        btn.pack(fill="x", pady=(20, 8), ipady=10)
+
+        # Bulk mode: score a whole CSV/xlsx file in a separate window
+        bulk_btn = ttk.Button(self.left_col, text="SCORE A FILE...", command=self.open_bulk_scoring, cursor="hand2")
+        bulk_btn.pack(fill="x", ipady=4)
 
         # Right Column: Results
         self.right_col = tk.Frame(self.main_frame, bg=self.current_bg)
@@ -284,6 +441,12 @@ class ProNutriApp(tk.Tk):
         self.pos_panel.update_bg(color)
         self.res_panel.update_bg(color)
 
+    def open_bulk_scoring(self):
+        path = filedialog.askopenfilename(parent=self, title="Products file",
+                                          filetypes=[("CSV or Excel", "*.csv *.xlsx *.xlsm"), ("All files", "*.*")])
+        if path:
+            BulkScoringWindow(self, path)
+
     def validate_and_calculate(self):
         vals = {}
         limited_keys = ['sugar', 'sat_fat', 'salt', 'fiber', 'protein', 'fruit']
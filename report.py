@@ -0,0 +1,314 @@
+import hashlib
+import html
+import json
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Une figure du rapport : kind ("confusion", "histogram", "combined"), nom
+# unique (nom du fichier png), titre, et données (listes json) à tracer.
+# L'empreinte des données décide si la figure doit être redessinée.
+FigureSpec = namedtuple("FigureSpec", ["kind", "name", "title", "data"])
+
+GRADES = ("A", "B", "C", "D", "E")
+GRADE_COLORS = {
+    "A": "#006400",   # vert foncé
+    "B": "#66BB66",   # vert clair
+    "C": "#FFD700",   # jaune
+    "D": "#FFA500",   # orange
+    "E": "#FF4500",   # rouge
+}
+# à incrémenter quand le rendu change : toutes les figures sont alors redessinées
+RENDER_VERSION = 1
+_COLUMN_PATTERN = re.compile(r"^ELECTRE_(Pess|Opt)_(.+)$")
+
+
+def confusion_figure(name, matrix, pred_labels=GRADES, true_labels=GRADES, title=None):
+    """Heatmap d'une matrice de confusion (lignes : note réelle, colonnes : prédiction)."""
+    matrix = np.asarray(matrix, dtype=np.int64)
+    return FigureSpec("confusion", name, title or name, {
+        "counts": matrix.tolist(),
+        "pred_labels": [str(x) for x in pred_labels],
+        "true_labels": [str(x) for x in true_labels],
+    })
+
+
+def histogram_figure(name, counts, title="Distribution du NutriScore (A - E)"):
+    """Histogramme des notes A..E (counts alignés sur GRADES)."""
+    return FigureSpec("histogram", name, title, {"counts": [int(c) for c in counts]})
+
+
+def combined_figure(name, true_counts, assigned, title=None):
+    """
+    Superposition NutriScore réel (fond gris) / affectations ELECTRE :
+    assigned : dict libellé (ex : "Pess λ=0.6") -> comptes A..E.
+    """
+    return FigureSpec("combined", name, title or "NutriScore réel vs ELECTRE", {
+        "true_counts": [int(c) for c in true_counts],
+        "assigned": [[label, [int(c) for c in counts]] for label, counts in assigned.items()],
+    })
+
+
+def figure_hash(spec):
+    """Empreinte du contenu d'une figure (type, titre, données, version du rendu)."""
+    payload = json.dumps([RENDER_VERSION, spec.kind, spec.title, spec.data], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _draw_confusion(fig, spec):
+    """
+    Couleur = part de la ligne (rappel de la note réelle), sur une échelle 0..1
+    commune à toutes les matrices : pas de colorbar par figure ni de texte par
+    case, les comptes sont dans le tableau html à côté de l'image.
+    """
+    counts = np.asarray(spec.data["counts"], dtype=float)
+    share = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    ax = fig.add_subplot()
+    ax.imshow(share, aspect="auto", cmap="Greens", vmin=0.0, vmax=1.0)
+    ax.set_title(spec.title, fontsize=10)
+    ax.set_xticks(range(share.shape[1]), spec.data["pred_labels"])
+    ax.set_yticks(range(share.shape[0]), spec.data["true_labels"])
+    ax.set_xlabel("Catégorie ELECTRE")
+    ax.set_ylabel("NutriScore réel")
+
+
+def _draw_histogram(fig, spec):
+    counts = np.asarray(spec.data["counts"])
+    ax = fig.add_subplot()
+    bars = ax.bar(GRADES, counts, color=[GRADE_COLORS[g] for g in GRADES])
+    ax.bar_label(bars, labels=[str(int(v)) for v in counts])
+    ax.set_title(spec.title)
+    ax.set_xlabel("NutriScore")
+    ax.set_ylabel("Nombre de produits")
+    ax.set_ylim(0, max(int(counts.max()), 1) * 1.1)
+
+
+def _draw_combined(fig, spec):
+    """Même figure que plot_electre_combined du notebook, à partir des comptes."""
+    true_counts = np.asarray(spec.data["true_counts"])
+    assigned = spec.data["assigned"]
+    x = np.arange(len(GRADES))
+    total_width = 0.8
+    width = total_width / max(1, len(assigned))
+
+    ax = fig.add_subplot()
+    ax.bar(x, true_counts, width=total_width + 0.02, color="lightgray", label="Vrai", zorder=0)
+    for k, (label, counts) in enumerate(assigned):
+        offset = (k - (len(assigned) - 1) / 2) * width
+        bars = ax.bar(x + offset, counts, width, color=[GRADE_COLORS[g] for g in GRADES],
+                      label=label, zorder=3, edgecolor="k", alpha=0.9)
+        ax.bar_label(bars, fontsize=8)
+
+    # frontières entre catégories
+    for idx_b, pos in enumerate(x[:-1] + 0.5, start=2):
+        ax.axvline(pos, color="gray", linestyle="--", linewidth=1)
+        ax.annotate(f"pi{idx_b}", (pos, 1), xycoords=("data", "axes fraction"), ha="center",
+                    va="top", color="gray", fontsize=9, backgroundcolor="white")
+
+    ax.set_xticks(x, GRADES)
+    ax.set_xlabel("NutriScore")
+    ax.set_ylabel("Nombre de produits")
+    ax.set_title(spec.title)
+    # place pour la légende au-dessus des barres
+    ax.set_ylim(0, max([int(true_counts.max()), 1] + [max(c) for _, c in assigned]) * 1.25)
+    ax.legend(loc="upper right", ncol=min(3, max(1, len(assigned))))
+
+
+# marges fixes : bbox_inches="tight" ou une mise en page automatique
+# redessinent la figure, et doubleraient le temps de rendu
+_RENDERERS = {
+    "confusion": (_draw_confusion, (4.0, 3.5), dict(left=0.2, right=0.95, bottom=0.16, top=0.9)),
+    "histogram": (_draw_histogram, (8.0, 5.0), dict(left=0.1, right=0.97, bottom=0.11, top=0.92)),
+    "combined": (_draw_combined, (10.0, 6.0), dict(left=0.08, right=0.98, bottom=0.09, top=0.93)),
+}
+
+
+def render_figure(task):
+    """
+    Dessine une figure (spec, chemin png, dpi) sur un Figure matplotlib
+    autonome, rendu par Agg : ni pyplot, ni fenêtre, ni état global.
+    """
+    from matplotlib.figure import Figure
+
+    spec, path, dpi = task
+    draw, figsize, margins = _RENDERERS[spec.kind]
+    fig = Figure(figsize=figsize)
+    fig.subplots_adjust(**margins)
+    draw(fig, spec)
+    fig.savefig(path, dpi=dpi, pil_kwargs={"compress_level": 1})
+    return path
+
+
+def _init_render_worker():
+    """Backend non interactif dans les workers (aucun affichage requis)."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+class RunReport:
+    """
+    Rapport d'un run (balayage de lambda, de poids...) rendu sans affichage dans
+    un dossier : une image png par figure et un index.html qui les rassemble
+    avec les tableaux (résumé des matrices, comptes de chaque matrice).
+    Les figures sont dessinées dans un pool de processus ; une figure dont
+    l'empreinte (figure_hash) n'a pas changé depuis le run précédent
+    (report.json) n'est pas redessinée.
+    """
+    MANIFEST = "report.json"
+    INDEX = "index.html"
+
+    def __init__(self, output_dir, title="Rapport ELECTRE TRI", dpi=80):
+        self.output_dir = output_dir
+        self.title = title
+        self.dpi = dpi
+        self.figures = []
+        self.tables = []
+
+    def add(self, spec):
+        if any(f.name == spec.name for f in self.figures):
+            raise ValueError(f"Figure '{spec.name}' déjà présente dans le rapport.")
+        self.figures.append(spec)
+        return spec
+
+    def add_table(self, name, df):
+        """Tableau (DataFrame) affiché en tête du rapport."""
+        self.tables.append((name, df))
+
+    def add_confusions(self, confusion_results):
+        """Matrices de confusion d'apply_and_confusion (dict nom -> DataFrame)."""
+        for name, cm_df in confusion_results.items():
+            self.add(confusion_figure(name, cm_df.to_numpy(), cm_df.columns, cm_df.index))
+
+    def add_sweep(self, acc, true_counts=None, summary=True):
+        """
+        Figures d'un balayage (ConfusionAccumulator) :
+        - tableau résumé (accuracy, rappel par classe) trié par accuracy ;
+        - histogramme des notes réelles (par défaut les lignes de la première
+          matrice, c.-à-d. les produits dont la note réelle est connue) ;
+        - pour chaque lambda, superposition réel / Pess / Opt ;
+        - une heatmap par colonne.
+        Les comptes affectés sont les sommes de colonnes des matrices : aucune
+        relecture des affectations.
+        """
+        if not acc.names:
+            return
+        if true_counts is None:
+            true_counts = acc.counts[0].sum(axis=1)
+        if summary:
+            self.add_table("Résumé", acc.summary().sort_values("accuracy", ascending=False).round(4))
+        self.add(histogram_figure("nutriscore_hist", true_counts))
+
+        by_lambda = {}
+        for name, matrix in zip(acc.names, acc.counts):
+            match = _COLUMN_PATTERN.match(name)
+            if match:
+                mode, lambd = match.groups()
+                by_lambda.setdefault(lambd, {})[f"{mode} λ={lambd}"] = matrix.sum(axis=0)
+        for lambd, assigned in by_lambda.items():
+            self.add(combined_figure(f"combined_{lambd}", true_counts, assigned,
+                                     title=f"NutriScore réel vs ELECTRE (λ={lambd})"))
+
+        for name in acc.names:
+            self.add(confusion_figure(name, acc.matrix(name)))
+
+    @staticmethod
+    def _file_name(name):
+        return re.sub(r"[^\w.=-]+", "_", name) + ".png"
+
+    def _read_manifest(self):
+        path = os.path.join(self.output_dir, self.MANIFEST)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("figures", {})
+
+    def render(self, n_jobs=None, force=False):
+        """
+        Écrit les png modifiés, report.json et index.html dans output_dir.
+        n_jobs : processus de rendu (None ou -1 = tous les cœurs, 1 = sans pool).
+        force=True redessine tout.
+        Retourne un dict : figures, rendered, skipped, removed, index.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        previous = {} if force else self._read_manifest()
+
+        manifest, tasks = {}, []
+        for spec in self.figures:
+            digest = figure_hash(spec)
+            file_name = self._file_name(spec.name)
+            manifest[spec.name] = {"kind": spec.kind, "hash": digest, "file": file_name}
+            path = os.path.join(self.output_dir, file_name)
+            if previous.get(spec.name) != manifest[spec.name] or not os.path.exists(path):
+                tasks.append((spec, path, self.dpi))
+
+        n_jobs = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+        n_jobs = min(n_jobs, len(tasks))
+        if n_jobs <= 1:
+            for task in tasks:
+                render_figure(task)
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_render_worker) as executor:
+                list(executor.map(render_figure, tasks,
+                                  chunksize=max(1, len(tasks) // (4 * n_jobs))))
+
+        # figures du run précédent absentes de ce run : png supprimés
+        kept = {entry["file"] for entry in manifest.values()}
+        removed = 0
+        for entry in previous.values():
+            stale = os.path.join(self.output_dir, entry["file"])
+            if entry["file"] not in kept and os.path.exists(stale):
+                os.remove(stale)
+                removed += 1
+
+        with open(os.path.join(self.output_dir, self.MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({"render_version": RENDER_VERSION, "figures": manifest}, f, indent=1)
+        index = os.path.join(self.output_dir, self.INDEX)
+        with open(index, "w", encoding="utf-8") as f:
+            f.write(self.to_html(manifest))
+
+        return {"figures": len(self.figures), "rendered": len(tasks),
+                "skipped": len(self.figures) - len(tasks), "removed": removed, "index": index}
+
+    @staticmethod
+    def _counts_table(spec):
+        """Comptes d'une matrice de confusion en table html (à la place du texte par case)."""
+        header = "".join(f"<th>{html.escape(c)}</th>" for c in spec.data["pred_labels"])
+        rows = "".join(
+            f"<tr><th>{html.escape(label)}</th>" + "".join(f"<td>{v}</td>" for v in row) + "</tr>"
+            for label, row in zip(spec.data["true_labels"], spec.data["counts"])
+        )
+        return f'<table class="counts"><tr><th></th>{header}</tr>{rows}</table>'
+
+    def to_html(self, manifest):
+        sections = [("Distributions", ("histogram", "combined")),
+                    ("Matrices de confusion", ("confusion",))]
+        parts = [
+            "<!DOCTYPE html>",
+            f'<html lang="fr"><head><meta charset="utf-8"><title>{html.escape(self.title)}</title>',
+            "<style>body{font-family:sans-serif;margin:1em 2em}"
+            ".grid{display:flex;flex-wrap:wrap;gap:1.5em}figure{margin:0}"
+            "table{border-collapse:collapse;font-size:0.85em}td,th{border:1px solid #ccc;padding:2px 6px;text-align:right}"
+            "table.counts{margin-top:0.3em}</style></head><body>",
+            f"<h1>{html.escape(self.title)}</h1>",
+        ]
+        for name, df in self.tables:
+            parts.append(f"<h2>{html.escape(name)}</h2>")
+            parts.append(df.to_html(border=0))
+        for heading, kinds in sections:
+            specs = [s for s in self.figures if s.kind in kinds]
+            if not specs:
+                continue
+            parts.append(f'<h2>{heading}</h2><div class="grid">')
+            for spec in specs:
+                # ?v=<empreinte> : le navigateur recharge les seules images modifiées
+                src = f'{manifest[spec.name]["file"]}?v={manifest[spec.name]["hash"][:12]}'
+                caption = self._counts_table(spec) if spec.kind == "confusion" else ""
+                parts.append(f'<figure><img src="{html.escape(src)}" alt="{html.escape(spec.title)}">'
+                             f"<figcaption>{caption}</figcaption></figure>")
+            parts.append("</div>")
+        parts.append("</body></html>")
+        return "\n".join(parts)
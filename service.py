@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import json
+import math
+import signal
+import time
+from collections import deque
+
+import numpy as np
+
+from instrumentation import stage
+from nutriscore_engine import NutriScoreEngine
+
+
+class LatencyStats:
+    """
+    Rolling window of latencies (seconds) with p50/p99.
+    """
+    def __init__(self, window=10000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def snapshot(self):
+        if not self.samples:
+            return {'count': self.count, 'p50_ms': None, 'p99_ms': None}
+        p50, p99 = np.percentile(np.fromiter(self.samples, dtype=float), [50, 99]) * 1000
+        return {'count': self.count, 'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3)}
+
+
+class ScoringService:
+    """
+    HTTP/JSON scoring service.
+    Concurrent requests are queued and scored together in micro-batches
+    (NutriScoreEngine.calculate_many and the vectorized ElectreTri path).
+
+    POST /score   a product (or a list of products) -> grade, score, N/P
+    GET  /metrics request latency p50/p99 and batch sizes
+    GET  /health
+    """
+    NUTRI_KEYS = ('energy', 'sat_fat', 'sugar', 'salt', 'fiber', 'protein', 'fruit')
+    LIMITED_KEYS = ('sugar', 'sat_fat', 'salt', 'fiber', 'protein', 'fruit')
+
+    def __init__(self, electre_model=None, max_batch=512, max_wait_ms=1.0):
+        self.electre = electre_model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.latency = LatencyStats()
+        self.batch_sizes = deque(maxlen=1000)
+        self.queue = None
+
+        # ELECTRE criteria may be sent either with the dataset column name
+        # or with the Nutri-Score key (energy -> Energie_kJ, ...)
+        self._criteria_aliases = {v: k for k, v in NutriScoreEngine.DATASET_COLUMNS.items()}
+
+    @staticmethod
+    def _number(value, key):
+        # only JSON numbers: true/false (bool is an int subclass) and strings
+        # are rejected, as are the NaN and Infinity that json.loads accepts,
+        # before the product joins a shared batch
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Please enter a valid number for {key}.")
+        try:
+            val = float(value)
+        except OverflowError:
+            raise ValueError(f"Please enter a valid number for {key}.")
+        if not math.isfinite(val):
+            raise ValueError(f"Please enter a valid number for {key}.")
+        return val
+
+    def validate(self, product):
+        # Same rules as ProNutriApp.validate_and_calculate
+        if not isinstance(product, dict):
+            raise ValueError("Each product must be a JSON object.")
+        for k in self.NUTRI_KEYS:
+            if k not in product:
+                raise ValueError(f"Missing value for {k}.")
+            val = self._number(product[k], k)
+            if val < 0:
+                raise ValueError(f"Value for {k} cannot be negative.")
+            if k in self.LIMITED_KEYS and val > 100:
+                raise ValueError(f"Value for '{k}' cannot exceed 100.")
+
+        if self.electre is not None:
+            # ELECTRE criteria are optional (no assignment without all of them),
+            # but any criterion that is sent must be a finite number
+            for crit in self.electre.criteria:
+                if crit in product:
+                    self._number(product[crit], crit)
+            group_col = self.electre.group_col
+            if group_col is not None and isinstance(product.get(group_col), (dict, list)):
+                raise ValueError(f"Value for {group_col} must be a string or a number.")
+
+    async def score(self, products):
+        for p in products:
+            self.validate(p)
+        loop = asyncio.get_running_loop()
+        futures = []
+        for p in products:
+            fut = loop.create_future()
+            self.queue.put_nowait((p, fut))
+            futures.append(fut)
+        return await asyncio.gather(*futures)
+
+    async def _batcher(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.queue.qsize() < self.max_batch and self.max_wait > 0:
+                # leave a short window for concurrent requests to join the batch
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            self.batch_sizes.append(len(batch))
+            try:
+                with stage("service.score_batch", rows=len(batch)):
+                    results = self._score_batch([p for p, _ in batch])
+            except Exception:
+                # a failing batch is scored again product by product:
+                # only the requests whose product fails get the error
+                self._resolve_one_by_one(batch)
+                continue
+            for (_, fut), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+    def _resolve_one_by_one(self, batch):
+        for product, fut in batch:
+            try:
+                res = self._score_batch([product])[0]
+            except Exception as exc:
+                if not fut.done():
+                    fut.set_exception(exc)
+            else:
+                if not fut.done():
+                    fut.set_result(res)
+
+    def _electre_value(self, product, crit):
+        if crit in product:
+            return product[crit]
+        return product.get(self._criteria_aliases.get(crit), np.nan)
+
+    def _score_batch(self, products):
+        arrays = {k: np.array([float(p[k]) for p in products]) for k in self.NUTRI_KEYS}
+        ns = NutriScoreEngine.calculate_many(arrays)
+
+        results = [
+            {
+                'grade': str(ns['grade'][i]), 'score': int(ns['score'][i]),
+                'color': NutriScoreEngine.COLORS[str(ns['grade'][i])],
+                'n_total': int(ns['n_total'][i]), 'p_total': int(ns['p_total'][i]),
+                'protein_excluded': bool(ns['protein_excluded'][i])
+            }
+            for i in range(len(products))
+        ]
+
+        if self.electre is not None:
+            X = np.array([[float(self._electre_value(p, c)) for c in self.electre.criteria]
+                          for p in products])
+            # only products carrying every ELECTRE criterion get an assignment
+            complete = ~np.isnan(X).any(axis=1)
+            if complete.any():
+                rows = np.flatnonzero(complete)
+                labels = self.electre.category_labels
+                groups = None
+                if self.electre.group_profiles is not None:
+                    # per-group profiles: the product's group field (e.g. Categorie)
+                    groups = self.electre.plan.slots([products[i].get(self.electre.group_col) for i in rows])
+                indices = self.electre._sweep_indices(X[rows], self.electre.lambdas, groups)
+                for j, i in enumerate(rows):
+                    results[i]['electre'] = {c: labels[idx[j]] for c, idx in indices.items()}
+        return results
+
+    def metrics(self):
+        sizes = np.fromiter(self.batch_sizes, dtype=float)
+        return {
+            'requests': self.latency.snapshot(),
+            'batches': {
+                'recent': len(sizes),
+                'mean_size': round(float(sizes.mean()), 2) if len(sizes) else None,
+                'max_size': int(sizes.max()) if len(sizes) else None
+            }
+        }
+
+    async def route(self, method, path, body):
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok'}
+        if method == 'GET' and path == '/metrics':
+            return 200, self.metrics()
+        if method == 'POST' and path == '/score':
+            try:
+                payload = json.loads(body or b'null')
+                products = payload if isinstance(payload, list) else [payload]
+                results = await self.score(products)
+            except ValueError as exc:
+                return 400, {'error': str(exc)}
+            return 200, results if isinstance(payload, list) else results[0]
+        return 404, {'error': f"Unknown route {method} {path}"}
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, value = line.decode('latin-1').split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                start = time.perf_counter()
+                try:
+                    status, payload = await self.route(method, path, body)
+                except Exception as exc:
+                    # unexpected failure: answer with a 500 instead of dropping the connection
+                    status, payload = 500, {'error': f"{type(exc).__name__}: {exc}"}
+                if path == '/score':
+                    self.latency.record(time.perf_counter() - start)
+
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {reasons[status]}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n"
+                    .encode('latin-1') + data
+                )
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        self.queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batcher())
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Scoring service listening on http://{host}:{port}")
+
+        # SIGINT/SIGTERM: clean return, so exit hooks (NUTRICSOR_PROFILE export) run
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: stop.done() or stop.set_result(None))
+            except NotImplementedError:    # Windows: Ctrl+C still raises KeyboardInterrupt
+                pass
+        try:
+            async with server:
+                await stop
+        finally:
+            batcher.cancel()
+
+
+def load_electre_model(profiles_path=None, dataset_path=None):
+    """ElectreTri with the project criteria, fitted once at startup."""
+    from electre import ElectreTri, criteria, directions, weights, category_labels
+
+    model = ElectreTri(criteria=criteria, directions=directions, weights=weights,
+                       category_labels=category_labels, lambdas=(0.6, 0.7))
+    if profiles_path:
+        model.load_profiles(profiles_path)
+    else:
+        import pandas as pd
+        model.build_limiting_profiles(pd.read_csv(dataset_path, usecols=criteria))
+    model.compile()
+    return model
+
+
+def random_product(rng):
+    return {
+        'energy': float(rng.uniform(0, 3800)), 'sat_fat': float(rng.uniform(0, 15)),
+        'sugar': float(rng.uniform(0, 60)), 'salt': float(rng.uniform(0, 5)),
+        'fiber': float(rng.uniform(0, 10)), 'protein': float(rng.uniform(0, 25)),
+        'fruit': float(rng.uniform(0, 100)), 'GreenScore_Score': float(rng.uniform(0, 100))
+    }
+
+
+async def run_load(host, port, n_requests, concurrency, seed=0):
+    """Load generator: `concurrency` keep-alive clients sending POST /score."""
+    rng = np.random.default_rng(seed)
+    latencies = []
+
+    async def client(n):
+        reader, writer = await asyncio.open_connection(host, port)
+        for _ in range(n):
+            body = json.dumps(random_product(rng)).encode()
+            start = time.perf_counter()
+            writer.write(
+                f"POST /score HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+            length = 0
+            await reader.readline()
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    per_client = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in per_client if n))
+    elapsed = time.perf_counter() - start
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {'requests': len(latencies), 'qps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nutri-Score / ELECTRE scoring service")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help="start the HTTP/JSON service")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8080)
+    serve.add_argument('--profiles', help="ElectreTri profiles csv (ElectreTri.save_profiles)")
+    serve.add_argument('--dataset', help="dataset csv used to build the ElectreTri profiles")
+    serve.add_argument('--max-batch', type=int, default=512)
+    serve.add_argument('--max-wait-ms', type=float, default=1.0)
+
+    load = sub.add_parser('loadgen', help="send concurrent requests to a running service")
+    load.add_argument('--host', default='127.0.0.1')
+    load.add_argument('--port', type=int, default=8080)
+    load.add_argument('-n', '--requests', type=int, default=10000)
+    load.add_argument('-c', '--concurrency', type=int, default=64)
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        model = None
+        if args.profiles or args.dataset:
+            model = load_electre_model(args.profiles, args.dataset)
+        service = ScoringService(model, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+        asyncio.run(service.serve(args.host, args.port))
+    else:
+        print(json.dumps(asyncio.run(run_load(args.host, args.port, args.requests, args.concurrency))))
+
+
+if __name__ == "__main__":
+    main()
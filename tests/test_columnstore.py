@@ -0,0 +1,79 @@
+"""Tests du ColumnStore : réécriture sur place, ajout de lignes, élargissement des types."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnstore import ColumnStore
+
+
+def make_store(path, n_rows=100):
+    df = pd.DataFrame({
+        "entier": np.arange(n_rows, dtype=np.int64),
+        "reel": np.linspace(0, 1, n_rows),
+        "lettre": pd.Series(list("ABCDE") * (n_rows // 5)),
+    })
+    return ColumnStore.from_dataframe(path, df), df
+
+
+def test_write_rows_patches_in_place(tmp_path):
+    store, df = make_store(tmp_path)
+    inode = os.stat(store._file("reel")).st_ino
+    patch = pd.DataFrame({"reel": [10.0, 20.0], "lettre": ["E", "Z"]})
+    store.write_rows(patch, [3, 42])
+
+    df.loc[[3, 42], ["reel", "lettre"]] = patch.to_numpy()
+    reread = ColumnStore(tmp_path).read()
+    assert os.stat(store._file("reel")).st_ino == inode
+    np.testing.assert_array_equal(reread["reel"], df["reel"].astype(float))
+    assert reread["lettre"].astype(str).tolist() == df["lettre"].tolist()
+
+
+def test_append_rows_extends_files_in_place(tmp_path):
+    store, df = make_store(tmp_path)
+    inode = os.stat(store._file("entier")).st_ino
+    extra = pd.DataFrame({"entier": [100, 101], "reel": [2.0, 3.0], "lettre": ["F", None]})
+    store.append_rows(extra)
+
+    reread = ColumnStore(tmp_path)
+    assert reread.n_rows == 102
+    assert os.stat(store._file("entier")).st_ino == inode
+    np.testing.assert_array_equal(reread.column("entier"), np.arange(102))
+    letters = reread.column("lettre")
+    assert letters[-2] == "F" and pd.isna(letters[-1])
+
+
+def test_append_rows_fills_missing_columns(tmp_path):
+    store, _ = make_store(tmp_path)
+    store.append_rows(pd.DataFrame({"entier": [100], "lettre": ["A"]}))
+    assert np.isnan(ColumnStore(tmp_path).column("reel")[-1])
+
+
+def test_fit_dtype_widens_integers_to_float(tmp_path):
+    store, df = make_store(tmp_path)
+    store.write_rows(pd.DataFrame({"entier": [0.5]}), [7])
+    store.append_rows(pd.DataFrame({"entier": [np.nan], "reel": [0.0], "lettre": ["A"]}))
+
+    column = ColumnStore(tmp_path).column("entier")
+    assert column.dtype == np.float64
+    expected = np.append(df["entier"].to_numpy(dtype=float), np.nan)
+    expected[7] = 0.5
+    np.testing.assert_array_equal(column, expected)
+
+
+def test_fit_dtype_widens_category_codes(tmp_path):
+    store, df = make_store(tmp_path)
+    many = pd.DataFrame({"lettre": [f"m{i}" for i in range(2 ** 15)]})
+    store.append_rows(many.assign(entier=0, reel=0.0))
+
+    reread = ColumnStore(tmp_path)
+    assert np.load(reread._file("lettre"), mmap_mode="r").dtype == np.int32
+    letters = reread.column("lettre")
+    assert letters[:5].tolist() == list("ABCDE") and letters[-1] == f"m{2 ** 15 - 1}"
+
+
+def test_write_rows_rejects_out_of_range_positions(tmp_path):
+    store, _ = make_store(tmp_path)
+    with pytest.raises(ValueError):
+        store.write_rows(pd.DataFrame({"reel": [1.0]}), [100])
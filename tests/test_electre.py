@@ -0,0 +1,283 @@
+"""
+Tests de non-régression : les affectations vectorisées d'ElectreTri doivent
+donner les mêmes catégories que les méthodes ligne par ligne d'origine
+(_assign_pessimistic_row / _assign_optimistic_row), égalités aux profils comprises.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnstore import ColumnStore
+from electre import (ElectreTri, _score_frame, category_labels, clean_product_names, criteria,
+                     directions, score_store_incremental, weights)
+
+LAMBDAS = [round(lambd, 2) for lambd in np.arange(0.5, 0.951, 0.05)]
+
+
+def make_model(**kwargs):
+    params = dict(criteria=criteria, directions=directions, weights=weights,
+                  category_labels=category_labels, lambdas=LAMBDAS)
+    return ElectreTri(**{**params, **kwargs})
+
+
+def make_products(n_rows, model, seed=0):
+    """Produits aléatoires, dont un tiers des valeurs exactement sur un profil (ou à ± p)."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({c: rng.gamma(2.0, 10.0, n_rows) for c in criteria})
+    model.build_limiting_profiles(df)
+    for crit in criteria:
+        p = model.preference_thresholds.get(crit, 0.0)
+        profile_values = model.profiles[crit].to_numpy()
+        exact = np.concatenate([profile_values, profile_values + p, profile_values - p])
+        on_profile = rng.random(n_rows) < 1 / 3
+        df.loc[on_profile, crit] = rng.choice(exact, on_profile.sum())
+    return df
+
+
+def row_wise(model, df, lambd):
+    rows = df[criteria].to_dict('records')
+    pessimistic = [model._assign_pessimistic_row(row, lambd) for row in rows]
+    optimistic = [model._assign_optimistic_row(row, lambd) for row in rows]
+    return pessimistic, optimistic
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"weights": dict(zip(criteria, [3, 1, 2, 2, 1, 1, 4, 2]))},
+    {"preference_thresholds": {c: 1.5 for c in criteria}},
+], ids=["poids_egaux", "poids_inegaux", "seuils_p"])
+def test_assign_matches_row_wise(params):
+    model = make_model(**params)
+    df = make_products(1_500, model)
+    for lambd in LAMBDAS:
+        pessimistic, optimistic = row_wise(model, df, lambd)
+        assert model.assign_pessimistic(df, lambd).tolist() == pessimistic, lambd
+        assert model.assign_optimistic(df, lambd).tolist() == optimistic, lambd
+
+
+def test_sweep_matches_assign():
+    model = make_model()
+    df = make_products(3_000, model, seed=1)
+    labels = model._sweep_labels(df, LAMBDAS)
+    for lambd in LAMBDAS:
+        assert labels[f"ELECTRE_Pess_{lambd}"].tolist() == model.assign_pessimistic(df, lambd).tolist()
+        assert labels[f"ELECTRE_Opt_{lambd}"].tolist() == model.assign_optimistic(df, lambd).tolist()
+
+
+# Mode crédibilité (ELECTRE TRI-B) : seuils q <= p <= v
+Q, P, V = 1.0, 3.0, 15.0
+
+
+def naive_credibility(model, a, b):
+    """sigma(a, b) calculé couple par couple, d'après les formules d'ELECTRE TRI-B."""
+    C, d = 0.0, []
+    for crit in criteria:
+        s = model.directions[crit]
+        q = model.indifference_thresholds.get(crit, model.preference_thresholds.get(crit, 0.0))
+        p = model.preference_thresholds.get(crit, 0.0)
+        v = model.veto_thresholds.get(crit, np.inf)
+        adv = s * b[crit] - s * a[crit]          # avance de b sur a
+        if q == p:
+            c = 1.0 if s * a[crit] + p >= s * b[crit] else 0.0
+        else:
+            c = min(1.0, max(0.0, (p - adv) / (p - q)))
+        C += model.weights[crit] * c
+        if np.isfinite(v):
+            d.append(min(1.0, max(0.0, (adv - p) / (v - p))) if v > p else float(adv >= v))
+    sigma = C
+    for d_j in d:
+        if d_j > C:
+            sigma *= (1.0 - d_j) / (1.0 - C)
+    return sigma
+
+
+def test_credibility_without_q_or_veto_is_crisp():
+    thresholds = {c: P for c in criteria}
+    crisp = make_model(preference_thresholds=thresholds)
+    credibility = make_model(preference_thresholds=thresholds, credibility=True)
+    df = make_products(1_500, crisp)
+    credibility.profiles = crisp.profiles
+
+    X = crisp._criteria_array(df)
+    for got, expected in zip(credibility._credibility_arrays(X), crisp._concordance_arrays(X)):
+        np.testing.assert_array_equal(got, expected)
+    for lambd in LAMBDAS:
+        assert credibility.assign_pessimistic(df, lambd).tolist() == crisp.assign_pessimistic(df, lambd).tolist()
+        assert credibility.assign_optimistic(df, lambd).tolist() == crisp.assign_optimistic(df, lambd).tolist()
+
+
+@pytest.mark.parametrize("veto", [{}, {c: V for c in criteria}], ids=["sans_veto", "veto"])
+def test_credibility_matches_naive_reference(veto):
+    model = make_model(preference_thresholds={c: P for c in criteria},
+                       indifference_thresholds={c: Q for c in criteria}, veto_thresholds=veto)
+    df = make_products(200, model, seed=4)
+    c_ap, c_pa = model._credibility_arrays(model._criteria_array(df))
+
+    for i, a in enumerate(df[criteria].to_dict('records')):
+        for k in range(6):
+            b = model.profiles.iloc[k]
+            assert c_ap[i, k] == pytest.approx(naive_credibility(model, a, b), rel=1e-12, abs=1e-15)
+            assert c_pa[i, k] == pytest.approx(naive_credibility(model, b, a), rel=1e-12, abs=1e-15)
+
+
+def test_credibility_plan_matches_batch():
+    model = make_model(preference_thresholds={c: P for c in criteria},
+                       indifference_thresholds={c: Q for c in criteria},
+                       veto_thresholds={c: V for c in criteria})
+    df = make_products(500, model, seed=5)
+    plan = model.compile()
+    for lambd in LAMBDAS:
+        batch = list(zip(model.assign_pessimistic(df, lambd), model.assign_optimistic(df, lambd)))
+        single = [plan.assign(values, lambd) for values in df[criteria].to_numpy()]
+        assert single == batch, lambd
+
+
+@pytest.mark.parametrize("params", [
+    {"preference_thresholds": {"Sucres_g": 1.0}, "indifference_thresholds": {"Sucres_g": 2.0}},
+    {"preference_thresholds": {"Sucres_g": 5.0}, "veto_thresholds": {"Sucres_g": 4.0}},
+], ids=["q_sup_p", "p_sup_v"])
+def test_inconsistent_thresholds_rejected(params):
+    with pytest.raises(ValueError):
+        make_model(**params)
+
+
+def test_group_profiles_round_trip_keeps_numeric_groups(tmp_path):
+    df = make_products(2_000, make_model())
+    df["CatId"] = np.random.default_rng(2).integers(0, 5, len(df))
+    model = make_model(group_col="CatId")
+    model.build_limiting_profiles(df)
+    labels = model._sweep_labels(df, LAMBDAS)
+
+    path = tmp_path / "profils.csv"
+    model.save_profiles(path)
+    reloaded = make_model()
+    reloaded.load_profiles(path)
+
+    assert reloaded.group_col == "CatId"
+    assert reloaded.group_profiles.index.equals(model.group_profiles.index)
+    assert reloaded.profile_drift(model.profiles, model.group_profiles) == 0.0
+    pd.testing.assert_frame_equal(reloaded._sweep_labels(df, LAMBDAS), labels)
+
+
+def test_sensitivity_empty_thresholds_candidate_is_crisp():
+    thresholds = {c: 5.0 for c in criteria}
+    model = make_model(preference_thresholds=thresholds)
+    df = make_products(2_000, model, seed=3)
+    df["NutriScore_Lettre"] = np.random.default_rng(3).choice(list("ABCDE"), len(df))
+    W = np.array([[weights[c] for c in criteria]])
+
+    results, _, _ = model.sensitivity_analysis(df, W, threshold_candidates=[{}, thresholds], lambdas=[0.6])
+    for t_id, candidate in enumerate([make_model(), model]):
+        candidate.profiles = model.profiles
+        for mode, assign in (("Pess", candidate.assign_pessimistic), ("Opt", candidate.assign_optimistic)):
+            row = results[(results.threshold_id == t_id) & (results["mode"] == mode)]
+            expected = (assign(df, 0.6) == df["NutriScore_Lettre"]).mean()
+            assert row["accuracy"].item() == pytest.approx(expected)
+
+
+def make_dataset(n_rows, seed=0):
+    """Dataset au format source : identité produit, critères, catégorie."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Nom_Produit": [f"produit {i % (n_rows // 2)}" for i in range(n_rows)],   # noms en double
+        "Marque": rng.choice(["m1", "m2", "m3"], n_rows),
+        "Categorie": rng.choice(["a", "b", "c"], n_rows),
+    })
+    for crit in criteria:
+        df[crit] = rng.gamma(2.0, 10.0, n_rows).round(2)
+    df["Fruits_Legumes_Pct"] = rng.uniform(0, 100, n_rows).round(1)
+    df["GreenScore_Score"] = rng.integers(0, 100, n_rows)
+    return df
+
+
+def run_incremental(tmp_path, df):
+    source = tmp_path / "source.csv"
+    df.to_csv(source, index=False)
+    return score_store_incremental(source, tmp_path / "store", make_model(), chunksize=700)
+
+
+def assert_matches_full_rescore(tmp_path, df):
+    """Le store doit contenir exactement le scoring complet de df avec les profils sauvegardés."""
+    df = pd.read_csv(tmp_path / "source.csv")     # valeurs telles que relues par le pipeline
+    model = make_model()
+    model.load_profiles(tmp_path / "store" / "profiles.csv")
+    expected = _score_frame(model, clean_product_names(df.copy()), LAMBDAS)
+    store = ColumnStore(tmp_path / "store")
+    assert store.n_rows == len(df)
+    for col in expected:
+        got = store.column(col)
+        if isinstance(got, pd.Categorical):
+            assert list(got.astype(object)) == expected[col].astype(object).tolist(), col
+        else:
+            np.testing.assert_array_equal(got, expected[col].to_numpy(), err_msg=col)
+    for col in criteria:
+        np.testing.assert_array_equal(store.column(col), df[col].to_numpy(dtype=float))
+
+
+def test_incremental_patches_changed_rows_in_place(tmp_path):
+    df = make_dataset(3_000)
+    run_incremental(tmp_path, df)
+    electre_file = ColumnStore(tmp_path / "store")._file(f"ELECTRE_Pess_{LAMBDAS[0]}")
+    inode = os.stat(electre_file).st_ino
+
+    df.loc[[5, 1_234, 2_999], "Sucres_g"] += 3.0
+    df.loc[[17], "Categorie"] = "d"              # colonne hors scoring : patchée sans re-scoring
+    result = run_incremental(tmp_path, df)
+
+    assert result["modified"] == 3 and result["rescored"] == 3 and not result["profiles_rebuilt"]
+    assert os.stat(electre_file).st_ino == inode
+    assert ColumnStore(tmp_path / "store").column("Categorie")[17] == "d"
+    assert_matches_full_rescore(tmp_path, df)
+
+
+def test_incremental_unchanged_reuses_profiles(tmp_path):
+    df = make_dataset(2_000)
+    run_incremental(tmp_path, df)
+    result = run_incremental(tmp_path, df)
+    assert result["rescored"] == 0 and result["drift"] == 0.0
+    assert_matches_full_rescore(tmp_path, df)
+
+
+def test_incremental_appends_new_rows(tmp_path):
+    df = make_dataset(3_000)
+    run_incremental(tmp_path, df)
+    extra = make_dataset(40, seed=1).assign(Nom_Produit=lambda d: "nouveau " + d["Nom_Produit"])
+    df = pd.concat([df, extra], ignore_index=True)
+    result = run_incremental(tmp_path, df)
+
+    assert result["new"] == 40 and result["removed"] == 0 and result["rescored"] == 40
+    assert_matches_full_rescore(tmp_path, df)
+
+
+def test_incremental_removed_rows_rebuild_store(tmp_path):
+    df = make_dataset(3_000)
+    run_incremental(tmp_path, df)
+    df = df.drop(index=[10, 2_500]).reset_index(drop=True)
+    result = run_incremental(tmp_path, df)
+
+    assert result["removed"] >= 2 and result["rescored"] == len(df)
+    assert_matches_full_rescore(tmp_path, df)
+
+
+def test_incremental_profile_drift_rescores_everything(tmp_path):
+    df = make_dataset(3_000)
+    run_incremental(tmp_path, df)
+    df["Sucres_g"] *= 3
+    result = run_incremental(tmp_path, df)
+
+    assert result["profiles_rebuilt"] and result["rescored"] == len(df)
+    assert_matches_full_rescore(tmp_path, df)
+
+
+def test_incremental_widens_integer_columns(tmp_path):
+    df = make_dataset(2_000)
+    run_incremental(tmp_path, df)
+    df["GreenScore_Score"] = df["GreenScore_Score"].astype(float)
+    df.loc[[3], "GreenScore_Score"] = 50.5
+    result = run_incremental(tmp_path, df)
+
+    assert result["modified"] == 1
+    assert ColumnStore(tmp_path / "store").column("GreenScore_Score").dtype == np.float64
+    assert_matches_full_rescore(tmp_path, df)
@@ -0,0 +1,30 @@
+"""Tests de l'instrumentation : agrégats bornés et export à la sortie du processus."""
+import json
+import os
+import subprocess
+import sys
+
+from instrumentation import Instrumentation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_records_bounded_summary_complete():
+    inst = Instrumentation(max_records=10)
+    inst.enable()
+    for _ in range(25):
+        with inst.stage("etape", rows=4):
+            pass
+    assert len(inst.records) == 10
+    summary = inst.summary()["etape"]
+    assert summary["calls"] == 25 and summary["rows"] == 100
+
+
+def test_profile_env_exports_on_exit(tmp_path):
+    output = tmp_path / "profil.json"
+    script = "from instrumentation import stage\nwith stage('etape', rows=3):\n    pass\n"
+    env = dict(os.environ, NUTRICSOR_PROFILE=str(output))
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, check=True)
+
+    exported = json.loads(output.read_text())
+    assert exported["summary"]["etape"]["rows"] == 3
@@ -0,0 +1,163 @@
+"""
+Regression tests: the table-driven, vectorized NutriScoreEngine must give the
+same results as the original scalar engine, exact threshold values included.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from nutriscore_engine import GENERAL_FOODS, NutriScoreEngine
+
+
+# Reference: the original scalar rules, kept verbatim as the oracle.
+def reference_points_n(energy, sat_fat, sugar, salt):
+    if energy > 3350: p_en = 10
+    elif energy <= 335: p_en = 0
+    else: p_en = int((energy - 1) // 335)
+
+    if sat_fat > 10: p_fa = 10
+    elif sat_fat <= 1: p_fa = 0
+    else: p_fa = int(sat_fat)
+
+    if sugar > 51: p_su = 15
+    elif sugar > 48: p_su = 14
+    elif sugar > 44: p_su = 13
+    elif sugar > 41: p_su = 12
+    elif sugar > 37: p_su = 11
+    elif sugar > 34: p_su = 10
+    elif sugar > 31: p_su = 9
+    elif sugar > 27: p_su = 8
+    elif sugar > 24: p_su = 7
+    elif sugar > 20: p_su = 6
+    elif sugar > 17: p_su = 5
+    elif sugar > 14: p_su = 4
+    elif sugar > 10: p_su = 3
+    elif sugar > 6.8: p_su = 2
+    elif sugar > 3.4: p_su = 1
+    else: p_su = 0
+
+    if salt > 4.0: p_sa = 20
+    elif salt > 0.2: p_sa = int(salt / 0.2)
+    else: p_sa = 0
+
+    return p_en + p_fa + p_su + p_sa
+
+
+def reference_points_p(fiber, protein, fruit):
+    if fiber > 7.4: p_fi = 5
+    elif fiber > 6.3: p_fi = 4
+    elif fiber > 5.2: p_fi = 3
+    elif fiber > 4.1: p_fi = 2
+    elif fiber > 3.0: p_fi = 1
+    else: p_fi = 0
+
+    if protein > 17: p_pr = 7
+    elif protein > 14: p_pr = 6
+    elif protein > 12: p_pr = 5
+    elif protein > 9.6: p_pr = 4
+    elif protein > 7.2: p_pr = 3
+    elif protein > 4.8: p_pr = 2
+    elif protein > 2.4: p_pr = 1
+    else: p_pr = 0
+
+    if fruit > 80: p_fr = 5
+    elif fruit > 60: p_fr = 2
+    elif fruit > 40: p_fr = 1
+    else: p_fr = 0
+
+    return p_fi, p_pr, p_fr
+
+
+def reference_calculate(vals):
+    score_n = reference_points_n(vals['energy'], vals['sat_fat'], vals['sugar'], vals['salt'])
+    p_fi, p_pr, p_fr = reference_points_p(vals['fiber'], vals['protein'], vals['fruit'])
+    protein_excluded = score_n >= 11 and vals['fruit'] <= 80
+    score_p = p_fi + p_fr if protein_excluded else p_fi + p_pr + p_fr
+    final_score = score_n - score_p
+
+    if final_score <= 0: grade = 'A'
+    elif final_score <= 2: grade = 'B'
+    elif final_score <= 10: grade = 'C'
+    elif final_score <= 18: grade = 'D'
+    else: grade = 'E'
+    return final_score, grade, score_n, score_p, protein_excluded
+
+
+# threshold values of the original rules, plus the floats the linear rules
+# switch on (energy: 335 * k + 1, salt: multiples of 0.2, sat_fat: integers)
+BOUNDARIES = {
+    'energy': [335.0, 3350.0] + [335.0 * k + d for k in range(12) for d in (0, 1)],
+    'sat_fat': [float(k) for k in range(12)] + [k + 0.5 for k in range(11)],
+    'sugar': [3.4, 6.8, 10, 14, 17, 20, 24, 27, 31, 34, 37, 41, 44, 48, 51],
+    'salt': [0.2, 4.0] + [k * 0.2 for k in range(22)] + [k / 5 for k in range(22)],
+    'fiber': [3.0, 4.1, 5.2, 6.3, 7.4],
+    'protein': [2.4, 4.8, 7.2, 9.6, 12, 14, 17],
+    'fruit': [40, 60, 80],
+}
+RANGES = {
+    'energy': 4000, 'sat_fat': 12, 'sugar': 60, 'salt': 5,
+    'fiber': 9, 'protein': 20, 'fruit': 100,
+}
+
+
+def fuzzed_inputs(n_rows, seed=0):
+    """Random values, a third of them on a boundary or one ulp away from it."""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for key, high in RANGES.items():
+        values = rng.uniform(0, high, n_rows)
+        exact = np.asarray(BOUNDARIES[key], dtype=float)
+        exact = np.concatenate([exact, np.nextafter(exact, -np.inf), np.nextafter(exact, np.inf)])
+        on_boundary = rng.random(n_rows) < 1 / 3
+        values[on_boundary] = rng.choice(exact, on_boundary.sum())
+        columns[key] = values
+    return pd.DataFrame(columns)
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    return fuzzed_inputs(100_000)
+
+
+def test_calculate_many_matches_reference(inputs):
+    result = NutriScoreEngine.calculate_many(inputs)
+    expected = [reference_calculate(vals) for vals in inputs.to_dict('records')]
+    score, grade, n_total, p_total, protein_excluded = (np.array(c) for c in zip(*expected))
+
+    np.testing.assert_array_equal(result['score'], score)
+    np.testing.assert_array_equal(result['grade'], grade)
+    np.testing.assert_array_equal(result['n_total'], n_total)
+    np.testing.assert_array_equal(result['p_total'], p_total)
+    np.testing.assert_array_equal(result['protein_excluded'], protein_excluded)
+
+
+def test_scalar_paths_match_reference(inputs):
+    for vals in inputs.head(5_000).to_dict('records'):
+        score, grade, n_total, p_total, _ = reference_calculate(vals)
+        assert NutriScoreEngine.get_points_n(vals['energy'], vals['sat_fat'], vals['sugar'], vals['salt']) == n_total
+        assert NutriScoreEngine.get_points_p(vals['fiber'], vals['protein'], vals['fruit']) \
+            == reference_points_p(vals['fiber'], vals['protein'], vals['fruit'])
+        result = NutriScoreEngine.calculate(vals)
+        assert (result['score'], result['grade']) == (score, grade)
+
+
+def test_dataset_columns_mapping(inputs):
+    renamed = inputs.rename(columns=NutriScoreEngine.DATASET_COLUMNS)
+    by_key = NutriScoreEngine.calculate_many(inputs)
+    by_column = NutriScoreEngine.calculate_many(renamed, columns=NutriScoreEngine.DATASET_COLUMNS)
+    np.testing.assert_array_equal(by_key['score'], by_column['score'])
+
+
+def test_parallel_matches_batch_with_active_table(inputs):
+    # a modified revision must reach the workers, not only the parent process
+    spec = {**GENERAL_FOODS, 'name': 'test-sugar',
+            'negative': {**GENERAL_FOODS['negative'], 'sugar': {'above': [5, 10, 20, 40]}}}
+    sample = inputs.head(20_000)
+    try:
+        NutriScoreEngine.use_table(spec)
+        expected = NutriScoreEngine.calculate_many(sample)
+        result = NutriScoreEngine.calculate_many_parallel(sample, n_jobs=2, n_partitions=5)
+    finally:
+        NutriScoreEngine.use_table(GENERAL_FOODS)
+    for key in expected:
+        np.testing.assert_array_equal(result[key], expected[key])
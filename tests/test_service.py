@@ -0,0 +1,18 @@
+"""Tests of ScoringService input validation (no server needed)."""
+import math
+
+import pytest
+
+from service import ScoringService
+
+PRODUCT = {'energy': 1000, 'sat_fat': 2.5, 'sugar': 10, 'salt': 1.2, 'fiber': 3, 'protein': 5, 'fruit': 20}
+
+
+def test_valid_product_accepted():
+    ScoringService().validate(PRODUCT)
+
+
+@pytest.mark.parametrize("value", [True, False, "12", None, math.nan, math.inf, 10 ** 400, [1], -1])
+def test_invalid_values_rejected(value):
+    with pytest.raises(ValueError):
+        ScoringService().validate({**PRODUCT, 'sugar': value})